@@ -0,0 +1,5 @@
+"""Search Google Drive folders and link matching documents into Google Sheets."""
+import os
+
+# Directory of url_linking_main.py, one level above the package: credentials, caches and journals live there
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
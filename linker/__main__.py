@@ -0,0 +1,4 @@
+import sys
+from linker.cli import main
+
+sys.exit(main())
@@ -0,0 +1,47 @@
+"""A1 notation helpers for Google Sheets ranges."""
+import re
+
+A1_CELL = re.compile(r'^([A-Z]+)(\d+)$')
+
+
+def column_to_letter(column):
+    """Convert column number to letter."""
+    letters = ''
+    while column > 0:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def letter_to_column(letters):
+    """Convert column letter to number (A -> 1)."""
+    column = 0
+    for letter in letters.upper():
+        column = column * 26 + ord(letter) - 64
+    return column
+
+
+def split_cell(cell):
+    """Split an A1 cell such as 'D23' into its column letter and row number."""
+    match = A1_CELL.match(cell.upper())
+    if not match:
+        raise ValueError(f"Invalid cell reference: {cell}")
+    return match.group(1), int(match.group(2))
+
+
+def block_range(tab_name, first_column, first_row, last_column, last_row):
+    """Format the A1 range of a block of cells, e.g. 'Tab'!D2:E10."""
+    return f"{quote_tab(tab_name)}!{first_column}{first_row}:{last_column}{last_row}"
+
+
+def quote_tab(tab_name):
+    """Quote a tab name for use in an A1 range, e.g. 'Q1 ''24'."""
+    return "'" + tab_name.replace("'", "''") + "'"
+
+
+def split_range(range_name):
+    """Split an A1 range such as 'Q1 ''24'!D2:E10 into its tab name (unquoted) and its cells."""
+    tab_name, _, cells = range_name.rpartition('!')
+    if len(tab_name) > 1 and tab_name[0] == tab_name[-1] == "'":
+        tab_name = tab_name[1:-1].replace("''", "'")
+    return tab_name, cells
@@ -0,0 +1,56 @@
+"""Grouping of independent API calls into Google's HTTP batch endpoint."""
+import random
+import time
+from linker.metrics import metrics
+from linker.scheduler import (BASE_DELAY, MAX_DELAY, MAX_RETRIES, execute_with_retry, is_retryable, request_operation,
+                              retry_after, scheduler)
+
+# Calls per batch request; Drive accepts at most 100
+BATCH_SIZE = 100
+
+
+def execute_batch(service, requests, on_result=None, batch_size=BATCH_SIZE, max_retries=MAX_RETRIES):
+    """Execute independent requests of one API client in as few HTTP round-trips as possible.
+
+    requests is a dict of key -> request (e.g. service.files().list(...)), sent in batches of at
+    most batch_size calls. A failing call does not affect the others: calls failing with 429 or
+    5xx are retried in a later batch with exponential backoff (at least any Retry-After delay),
+    other errors are kept. A 429 of a call also slows down its quota in linker.scheduler.
+    on_result(key, response, error), if given, is called as each call completes.
+    Returns (responses, errors), two dicts keyed like requests.
+    """
+    responses, errors = {}, {}
+    pending = dict(requests)
+    for attempt in range(max_retries + 1):
+        retry = {}
+        wait = 0.0
+        keys = list(pending)
+        for start in range(0, len(keys), batch_size):
+            group = keys[start:start + batch_size]
+
+            def callback(request_id, response, exception, group=group):
+                nonlocal wait
+                key = group[int(request_id)]
+                if exception is not None and is_retryable(exception) and exception.resp.status == 429:
+                    scheduler.release(request_operation(pending[key]), 429, exception.resp)
+                    wait = max(wait, retry_after(exception.resp) or 0)
+                if exception is not None and is_retryable(exception) and attempt < max_retries:
+                    retry[key] = pending[key]
+                    return
+                if exception is not None:
+                    errors[key] = exception
+                else:
+                    responses[key] = response
+                if on_result:
+                    on_result(key, response, exception)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for position, key in enumerate(group):
+                batch.add(pending[key], request_id=str(position))
+            execute_with_retry(batch)
+        if not retry:
+            break
+        pending = retry
+        metrics.count('retries', len(retry))
+        time.sleep(max(random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt)), wait))
+    return responses, errors
@@ -0,0 +1,104 @@
+"""Bounded in-memory cache shared by the Drive and Sheets helpers."""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds an entry stays fresh, per namespace
+DEFAULT_TTLS = {
+    'folders': 600,    # folder list of the folder dialog
+    'sheets': 600,     # spreadsheet list of the sheet picker, in full or by name
+    'listings': 600,   # folder ID -> files
+    'metadata': 60,    # sheet_id -> tabs, grid sizes and header rows
+}
+
+# Upper bound of the estimated size of all entries
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def estimate_size(value):
+    """Roughly estimate the memory used by a value made of lists, tuples, dicts and strings."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class Cache:
+    """Namespaced cache with per-namespace TTLs, LRU eviction by estimated size and hit/miss statistics."""
+
+    def __init__(self, ttls=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # (namespace, key) -> (expires, size, value), oldest first
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _count(self, namespace, event, amount=1):
+        counters = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0})
+        counters[event] += amount
+
+    def get(self, namespace, key, default=None):
+        """Return a fresh cached value, or default."""
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove((namespace, key))
+                entry = None
+            if entry is None:
+                self._count(namespace, 'misses')
+                return default
+            self._entries.move_to_end((namespace, key))
+            self._count(namespace, 'hits')
+            return entry[2]
+
+    def set(self, namespace, key, value):
+        """Cache a value, evicting the least recently used entries beyond max_bytes."""
+        size = estimate_size(value)
+        expires = time.monotonic() + self.ttls.get(namespace, 60)
+        with self._lock:
+            if (namespace, key) in self._entries:
+                self._remove((namespace, key))
+            self._entries[(namespace, key)] = (expires, size, value)
+            self.size += size
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._count(oldest[0], 'evictions')
+
+    def invalidate(self, namespace, match=None):
+        """Drop the entries of a namespace, or only those whose key satisfies match(key)."""
+        with self._lock:
+            stale = [entry for entry in self._entries
+                     if entry[0] == namespace and (match is None or match(entry[1]))]
+            for entry in stale:
+                self._remove(entry)
+            self._count(namespace, 'invalidations', len(stale))
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """Return hit/miss/eviction/invalidation counters, entry count and bytes per namespace."""
+        with self._lock:
+            stats = {namespace: dict(counters, entries=0, bytes=0) for namespace, counters in self._stats.items()}
+            for (namespace, _), (_, size, _) in self._entries.items():
+                counters = stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'evictions': 0,
+                                                        'invalidations': 0, 'entries': 0, 'bytes': 0})
+                counters['entries'] += 1
+                counters['bytes'] += size
+            return stats
+
+    def _remove(self, entry):
+        _, size, _ = self._entries.pop(entry)
+        self.size -= size
+
+
+# Cache shared by the Drive and Sheets helpers
+cache = Cache()
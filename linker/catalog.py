@@ -0,0 +1,84 @@
+"""Type-ahead index of the spreadsheets of a Drive, for the sheet picker."""
+import re
+from bisect import bisect_left
+from itertools import islice
+
+WORD = re.compile(r'\w+')
+
+# Sorts after any character of a word, to bound the index range of a prefix
+LAST_CHAR = '\U0010ffff'
+
+# A search walks the names in order rather than collect every candidate once the narrowest
+# term has more than this many times limit words
+WALK_FACTOR = 20
+
+
+def words(text):
+    """Split a name or query into casefolded words."""
+    return WORD.findall(text.casefold())
+
+
+class SheetCatalog:
+    """Spreadsheets by ID with a sorted index of the words of their names.
+
+    search() finds the sheets having, for every word of the query, a name word starting with it
+    (like Drive's name contains) by bisecting the word index, so each keystroke of a type-ahead
+    costs a few lookups whatever the number of sheets. Sheets can be added page by page while
+    a listing is in progress; complete is set once the whole Drive has been listed.
+    """
+
+    def __init__(self, sheets=()):
+        self.names = {}      # sheet ID -> name
+        self.complete = False
+        self._words = []     # sorted (word, sheet ID)
+        self._sorted = []    # sorted (casefolded name, name, sheet ID)
+        self._pending = []   # sheets added since the last search
+        self.add(sheets)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, sheets):
+        """Add sheets given as dicts with id and name; known sheets are skipped."""
+        for sheet in sheets:
+            if sheet['id'] in self.names:
+                continue
+            self.names[sheet['id']] = sheet['name']
+            self._pending.append(sheet)
+
+    def index(self):
+        """Index the sheets added since the last search (search does so itself)."""
+        if self._pending:
+            # Both lists are merged as two sorted runs
+            self._words = sorted(self._words + sorted((word, sheet['id']) for sheet in self._pending
+                                                      for word in set(words(sheet['name']))))
+            self._sorted = sorted(self._sorted + sorted((sheet['name'].casefold(), sheet['name'], sheet['id'])
+                                                        for sheet in self._pending))
+            self._pending = []
+
+    def _range(self, prefix):
+        """Return the slice of the word index holding the words starting with prefix."""
+        return bisect_left(self._words, (prefix,)), bisect_left(self._words, (prefix + LAST_CHAR,))
+
+    def search(self, query='', limit=None):
+        """Return the (name, ID) of the sheets matching a query, sorted by name, at most limit of them."""
+        self.index()
+        terms = set(words(query))
+        if not terms:
+            found = self._sorted[:limit] if limit is not None else self._sorted
+            return [(name, sheet_id) for _, name, sheet_id in found]
+
+        def matches(name):
+            name_words = words(name)
+            return all(any(word.startswith(term) for word in name_words) for term in terms)
+
+        # Candidates come from the term with the fewest words, the other terms are checked on them
+        low, high = min((self._range(term) for term in terms), key=lambda bounds: bounds[1] - bounds[0])
+        if limit is not None and high - low > WALK_FACTOR * limit:
+            # A short, common prefix: walk the names in order until limit of them match
+            found = islice((entry for entry in self._sorted if matches(entry[1])), limit)
+        else:
+            ids = {sheet_id for _, sheet_id in self._words[low:high]}
+            found = sorted((self.names[sheet_id].casefold(), self.names[sheet_id], sheet_id) for sheet_id in ids
+                           if matches(self.names[sheet_id]))[:limit]
+        return [(name, sheet_id) for _, name, sheet_id in found]
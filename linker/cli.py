@@ -0,0 +1,282 @@
+"""Headless command line for searching Drive folders and linking matches into Google Sheets.
+
+    python -m linker search --folder FOLDER --sheet SHEET --tab TAB --id-col B --phone-col C [--link-col D]
+    python -m linker batch jobs.json
+    python -m linker watch jobs.json
+    python -m linker importtime
+
+A manifest is a JSON list of jobs with the keys folder, sheet, tab, id_col, phone_col and
+optionally link_col, key_patterns and match_mode. All jobs share one authentication. Each folder
+is listed and indexed once, and the sheet targets are matched and linked concurrently (--workers).
+A job can also list several targets sharing its other keys:
+
+    [{"folder": "FOLDER", "id_col": "B", "phone_col": "C",
+      "targets": [{"sheet": "SHEET", "tab": "Jan", "link_col": "F"}, {"sheet": "SHEET", "tab": "Feb", "link_col": "F"}]}]
+
+Key patterns are regular expressions whose 'key' group (or first group) is the document number
+of a file name; the default is (?P<key>\d+)#. In a manifest a pattern can also be a dict with
+pattern, normalize (strip_zeros, digits, casefold or none) and name keys.
+
+A match mode of prefix or contains also matches cells that start with or contain the document
+number, such as '12345-B' or a formatted phone number.
+
+The listing of a folder can be narrowed down on the Drive side with the name_contains (a list of
+strings, --name-contains), mime_types (--mime-type) and modified_after (--modified-after) keys.
+Drive matches name_contains against the start of the words of a file name.
+
+A job with relink (--relink) updates a link column filled by an earlier run, writing only the
+cells whose link is missing or changed; clear_stale (--clear-stale) also clears the links of rows
+that no longer match, and dry_run (--dry-run) only reports the planned changes.
+
+watch keeps running: after one re-link of every job it polls the Drive Changes API every
+--interval seconds and links the documents added to or renamed in the folders as they arrive
+(see linker.watch). Every job needs a link_col.
+"""
+import argparse
+import csv
+import json
+import sys
+from linker.drive import list_files_many, use_store
+from linker.emulator import Emulator, parse_spec
+from linker.emulator import from_env as emulator_from_env
+from linker.importtime import STARTUP_MODULES, format_times, measure
+from linker.lookup import MATCH_MODES
+from linker.pipeline import MAX_WORKERS, job_filters, run_fan_out
+from linker.scheduler import LIMITS, scheduler
+from linker.matching import Match
+from linker.metrics import metrics, profile
+from linker.services import ServiceRegistry
+from linker.sheets import format_plan, list_tabs_many, parse_sheet_id
+from linker.store import DEFAULT_PATH, ListingStore
+from linker.watch import POLL_INTERVAL, SHEET_REFRESH, Watcher
+
+JOB_FIELDS = ['folder', 'sheet', 'tab', 'id_col', 'phone_col', 'link_col']
+
+
+def load_manifest(path):
+    """Load the list of jobs from a JSON manifest file."""
+    with open(path) as manifest:
+        jobs = json.load(manifest)
+    if isinstance(jobs, dict):
+        jobs = jobs.get('jobs', [])
+    # A job with targets stands for one job per target, each inheriting the other keys
+    jobs = [dict({key: value for key, value in job.items() if key != 'targets'}, **target)
+            for job in jobs for target in job.get('targets') or [{}]]
+    for job in jobs:
+        missing = [field for field in JOB_FIELDS[:-1] if not job.get(field)]
+        if missing:
+            raise ValueError(f"Job {job} is missing {', '.join(missing)}")
+    return jobs
+
+
+def parse_limits(specs):
+    """Parse QUOTA=PER_MINUTE rate limits into a dict for linker.scheduler.Scheduler.configure."""
+    limits = {}
+    for spec in specs:
+        name, _, value = spec.partition('=')
+        if name not in LIMITS or not value.isdigit():
+            raise ValueError(f"Invalid rate limit '{spec}', expected QUOTA=PER_MINUTE with QUOTA one of "
+                             f"{', '.join(LIMITS)}")
+        limits[name] = int(value)
+    return limits
+
+
+def write_json(results, out):
+    """Write job results as JSON."""
+    payload = [dict(result, matches=[match._asdict() for match in result['matches']]) for result in results]
+    json.dump(payload, out, indent=2)
+    out.write('\n')
+
+
+def write_csv(results, out):
+    """Write job results as CSV, one line per match."""
+    writer = csv.writer(out)
+    writer.writerow(JOB_FIELDS + list(Match._fields))
+    for result in results:
+        job = [result['job'].get(field, '') for field in JOB_FIELDS]
+        for match in result['matches']:
+            writer.writerow(job + list(match))
+
+
+def report(result):
+    """Print the outcome of a job on stderr."""
+    job = result['job']
+    status = result['error'] or f"{len(result['matches'])} hits, {result['linked']} linked"
+    if not result['error'] and result['write'] and 'dry_run' in result['write']:
+        planned = 'planned' if result['write']['dry_run'] else f"{result['write']['cleared']} cleared"
+        status += f" ({format_plan(result['write'])}; {planned})"
+    print(f"{job['folder']} -> {job['sheet']} [{job['tab']}]: {status}", file=sys.stderr)
+
+
+def run_jobs(jobs, token_path='token.json', credentials_path=None, emulator=None, max_workers=MAX_WORKERS):
+    """Authenticate once and run every job, reporting progress on stderr.
+
+    Each folder is indexed once and its targets are matched and linked on up to max_workers
+    threads (see linker.pipeline.run_fan_out).
+    With an emulator (linker.emulator.Emulator) the jobs run against its synthetic data.
+    """
+    registry = ServiceRegistry(token_path, credentials_path, emulator=emulator)
+    drive = registry.drive()
+    sheets = registry.sheets()
+
+    # Load the tabs of every sheet and the listings of every folder up front, in HTTP batches
+    tabs, _ = list_tabs_many(sheets, filter(None, (parse_sheet_id(job['sheet']) for job in jobs)))
+    folders, failed = {}, {}
+    for job in jobs:
+        folders.setdefault(json.dumps(job_filters(job), sort_keys=True), []).append(job['folder'])
+    for filters, folder_ids in folders.items():
+        _, errors = list_files_many(drive, folder_ids, filters=json.loads(filters))
+        for folder_id, error in errors.items():
+            failed[folder_id, filters] = f"Listing folder {folder_id} failed: {error}"
+
+    results = {}
+    runnable = []
+    for position, job in enumerate(jobs):
+        sheet_tabs = tabs.get(parse_sheet_id(job['sheet']))
+        error = failed.get((job['folder'], json.dumps(job_filters(job), sort_keys=True)))
+        if error is None and sheet_tabs is not None and job['tab'] not in sheet_tabs:
+            error = f"Tab '{job['tab']}' not found in the Google Sheet."
+        if error:
+            results[position] = {'job': job, 'matches': [], 'linked': 0, 'write': None, 'error': error}
+            report(results[position])
+        else:
+            runnable.append(position)
+
+    fanned_out = run_fan_out(registry, [jobs[position] for position in runnable], max_workers, on_result=report)
+    results.update(zip(runnable, fanned_out))
+    return [results[position] for position in range(len(jobs))]
+
+
+def watch_jobs(jobs, token_path='token.json', credentials_path=None, emulator=None, interval=POLL_INTERVAL,
+               sheet_refresh=SHEET_REFRESH, catch_up=True, max_polls=None):
+    """Authenticate once and link the documents arriving in the jobs' folders until interrupted."""
+    registry = ServiceRegistry(token_path, credentials_path, emulator=emulator)
+
+    def poll_failed(error):
+        print(f"Fetching the Drive changes failed, retrying in {interval:g}s: {error}", file=sys.stderr)
+
+    watcher = Watcher(registry, jobs, sheet_refresh, on_result=report, on_error=poll_failed)
+    watcher.start(catch_up)
+    print(f"Watching {len({job['folder'] for job in jobs})} folders every {interval:g}s", file=sys.stderr)
+    try:
+        watcher.run(interval, max_polls=max_polls)
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    """Build the argument parser."""
+    parser = argparse.ArgumentParser(prog='python -m linker', description=__doc__.splitlines()[0])
+    parser.add_argument('--format', choices=['json', 'csv'], default='json', help="Output format")
+    parser.add_argument('--output', help="Write results to this file instead of stdout")
+    parser.add_argument('--token', default='token.json', help="Path of the saved OAuth token")
+    parser.add_argument('--credentials', help="Path of the OAuth client credentials.json")
+    parser.add_argument('--cache', default=DEFAULT_PATH, help="Path of the persistent folder listing cache")
+    parser.add_argument('--no-cache', action='store_true', help="List folders from Drive without the persistent cache")
+    parser.add_argument('--emulator', metavar='SETTINGS',
+                        help="Run against the local Drive/Sheets emulator, e.g. 'rows=100000,latency=0.1' "
+                             "(default: the LINKER_EMULATOR environment variable)")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                        help="Sheet targets matched and linked at the same time")
+    parser.add_argument('--rate-limit', metavar='QUOTA=PER_MINUTE', action='append', default=[],
+                        help=f"Requests per minute of a quota ({', '.join(LIMITS)}; 0 for no limit), "
+                             f"e.g. sheets_read=300 for a project-wide quota (repeatable)")
+    parser.add_argument('--report', metavar='PATH', help="Write a JSON timing report of the API calls and stages")
+    parser.add_argument('--profile', metavar='PATH', help="Profile the run with cProfile and save the stats")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    search = commands.add_parser('search', help="Search one folder against one sheet tab")
+    search.add_argument('--folder', required=True, help="Google Drive folder ID")
+    search.add_argument('--sheet', required=True, help="Google Sheet link or ID")
+    search.add_argument('--tab', required=True, help="Tab name")
+    search.add_argument('--id-col', required=True, help="Column letter of the IDs")
+    search.add_argument('--phone-col', required=True, help="Column letter of the phone numbers")
+    search.add_argument('--link-col', help="Empty column letter to paste the URLs into")
+    search.add_argument('--key-pattern', action='append', dest='key_patterns',
+                        help="Regular expression extracting the document number from file names (repeatable)")
+    search.add_argument('--match-mode', choices=MATCH_MODES, default='exact',
+                        help="Match cells equal to, starting with or containing the document number")
+    search.add_argument('--name-contains', action='append',
+                        help="Only list files with a name word starting with this text (repeatable, any matches)")
+    search.add_argument('--mime-type', action='append', dest='mime_types',
+                        help="Only list files of this MIME type (repeatable)")
+    search.add_argument('--modified-after', metavar='TIME',
+                        help="Only list files modified after this RFC 3339 time, e.g. 2024-05-01T00:00:00")
+
+    batch = commands.add_parser('batch', help="Run every job of a JSON manifest")
+    batch.add_argument('manifest', help="Path of the JSON manifest")
+
+    watch = commands.add_parser('watch', help="Link the documents arriving in the folders of a manifest's jobs")
+    watch.add_argument('manifest', help="Path of the JSON manifest")
+    watch.add_argument('--interval', type=float, default=POLL_INTERVAL, help="Seconds between two polls of Drive")
+    watch.add_argument('--sheet-refresh', type=float, default=SHEET_REFRESH,
+                       help="Seconds after which the sheets are read again for new rows")
+    watch.add_argument('--no-catch-up', action='store_true', help="Skip the re-link of every job on start")
+    watch.add_argument('--max-polls', type=int, help="Stop after this many polls")
+
+    for command in (search, batch):
+        command.add_argument('--relink', action='store_true',
+                             help="Update links of an earlier run, writing only the cells that changed")
+        command.add_argument('--clear-stale', action='store_true',
+                             help="With --relink, clear the links of rows that no longer match")
+        command.add_argument('--dry-run', action='store_true', help="Report the changes --relink would make")
+
+    importtime = commands.add_parser('importtime', help="Measure the import time of the GUI's modules")
+    importtime.add_argument('modules', nargs='*', help="Modules to import instead")
+    importtime.add_argument('--json', action='store_true', help="Print the time of every module as JSON")
+    return parser
+
+
+def main(argv=None):
+    """Run the command line."""
+    args = build_parser().parse_args(argv)
+    if args.command == 'importtime':
+        total, times = measure(args.modules or STARTUP_MODULES)
+        if args.json:
+            json.dump({'total_us': total, 'modules': times}, sys.stdout, indent=2)
+            sys.stdout.write('\n')
+        else:
+            print(format_times(total, times))
+        return 0
+
+    if args.command == 'search':
+        jobs = [{'folder': args.folder, 'sheet': args.sheet, 'tab': args.tab, 'id_col': args.id_col,
+                 'phone_col': args.phone_col, 'link_col': args.link_col, 'key_patterns': args.key_patterns,
+                 'match_mode': args.match_mode, 'name_contains': args.name_contains,
+                 'mime_types': args.mime_types, 'modified_after': args.modified_after}]
+    else:
+        jobs = load_manifest(args.manifest)
+    for option in ('relink', 'clear_stale', 'dry_run'):
+        if getattr(args, option, False):
+            for job in jobs:
+                job[option] = True
+
+    emulator = Emulator(**parse_spec(args.emulator)) if args.emulator is not None else emulator_from_env()
+    # The persistent cache only holds real Drive listings
+    if not args.no_cache and emulator is None:
+        use_store(ListingStore(args.cache))
+    scheduler.configure(dict(emulator.limits() if emulator else LIMITS, **parse_limits(args.rate_limit)))
+
+    if args.command == 'watch':
+        watch_jobs(jobs, args.token, args.credentials, emulator, args.interval, args.sheet_refresh,
+                   not args.no_catch_up, args.max_polls)
+        return 0
+
+    if args.profile:
+        with profile(args.profile):
+            results = run_jobs(jobs, args.token, args.credentials, emulator, args.workers)
+    else:
+        results = run_jobs(jobs, args.token, args.credentials, emulator, args.workers)
+
+    if args.report:
+        with open(args.report, 'w') as report:
+            json.dump(metrics.report(), report, indent=2)
+            report.write('\n')
+
+    write = write_csv if args.format == 'csv' else write_json
+    if args.output:
+        with open(args.output, 'w', newline='') as out:
+            write(results, out)
+    else:
+        write(results, sys.stdout)
+    return 1 if any(result['error'] for result in results) else 0
@@ -0,0 +1,66 @@
+"""Concurrent crawl of Google Drive folders."""
+from concurrent.futures import FIRST_COMPLETED, wait
+from linker.batch import BATCH_SIZE
+from linker.drive import FOLDER_MIME_TYPE, list_files_many
+from linker.scheduler import lane
+
+
+def count_documents(files):
+    """Count the documents of a folder Listing, leaving out subfolders."""
+    return files.count(exclude=FOLDER_MIME_TYPE)
+
+
+def crawl(registry, folder_ids, on_folder=None, recursive=False, max_workers=8, batch_size=BATCH_SIZE,
+          on_error=None):
+    """List several Drive folders concurrently.
+
+    registry is the linker.services.ServiceRegistry handing out the Drive clients and the pool
+    of crawler threads, which is kept between crawls along with the clients of its threads.
+    Folders are listed in groups of batch_size, each group through HTTP batch requests
+    (see linker.drive.list_files_many), and the groups run in parallel threads, in the bulk lane of
+    linker.scheduler so they yield to interactive requests.
+    on_folder(folder_id, files) is called from the calling thread as each listing arrives, so
+    counts can be shown while the crawl continues; raising from it stops the crawl.
+    A folder that cannot be listed is left out and reported to on_error(folder_id, error).
+    With recursive, subfolders are crawled too. Returns a dict of folder ID -> Listing.
+    """
+    def fetch(group):
+        with lane('bulk'):
+            return list_files_many(registry.drive(), group)
+
+    listings = {}
+    seen = set()
+    executor = registry.pool('crawler', max_workers)
+
+    def submit(new_ids):
+        new_ids = [folder_id for folder_id in dict.fromkeys(new_ids) if folder_id not in seen]
+        seen.update(new_ids)
+        # Spread small crawls over the workers, large ones in full batches
+        size = max(1, min(batch_size, -(-len(new_ids) // max_workers)))
+        for start in range(0, len(new_ids), size):
+            pending.add(executor.submit(fetch, new_ids[start:start + size]))
+
+    pending = set()
+    try:
+        submit(folder_ids)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                group_listings, errors = future.result()
+                for folder_id, error in errors.items():
+                    if on_error:
+                        on_error(folder_id, error)
+                subfolders = []
+                for folder_id, files in group_listings.items():
+                    listings[folder_id] = files
+                    if on_folder:
+                        on_folder(folder_id, files)
+                    if recursive:
+                        subfolders.extend(files.ids(FOLDER_MIME_TYPE))
+                if subfolders:
+                    submit(subfolders)
+    finally:
+        # The pool outlives the crawl; only the groups not started yet are dropped
+        for future in pending:
+            future.cancel()
+    return listings
@@ -0,0 +1,223 @@
+"""Google Drive folder and file listings."""
+import json
+from linker.batch import execute_batch
+from linker.cache import cache
+from linker.listing import Listing
+from linker.scheduler import execute_with_retry
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+
+# Largest page size accepted by files().list
+PAGE_SIZE = 1000
+
+# Fields of the listed files: all that linker.listing.Listing keeps
+LIST_FIELDS = "nextPageToken, files(id, name, mimeType)"
+
+SHEETS_QUERY = f"mimeType = '{SPREADSHEET_MIME_TYPE}' and trashed = false"
+
+# Listing filters pushed down into the files.list query (see files_query)
+FILTERS = ('name_contains', 'mime_types', 'modified_after')
+
+# Persistent listing cache (linker.store.ListingStore), enabled with use_store()
+store = None
+
+
+def use_store(listing_store):
+    """Keep folder listings in a persistent store across sessions (None disables it)."""
+    global store
+    store = listing_store
+
+
+def list_folders(service):
+    """List available folders in the Google Drive.
+
+    Document counts are filled in separately by linker.crawler so the folder list can be shown at once.
+    """
+    # Check if folders list is already cached
+    folders = cache.get('folders', 'all')
+    if folders is not None:
+        return folders
+
+    folders = []
+    page_token = None
+    while True:
+        response = execute_with_retry(service.files().list(q=f"mimeType = '{FOLDER_MIME_TYPE}' and trashed = false",
+                                                           fields="nextPageToken, files(id, name)",
+                                                           pageSize=PAGE_SIZE,
+                                                           pageToken=page_token))
+        folders.extend(response.get('files', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+    # Cache the folders list
+    cache.set('folders', 'all', folders)
+    return folders
+
+
+def quote(value):
+    """Quote a string literal for a files.list query."""
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def files_query(folder_id, filters=None):
+    """Build the files.list query of the files of a folder that are not in the trash.
+
+    filters (a dict, see FILTERS) narrows the listing down on the server: name_contains is a list
+    of strings one of which the name must contain, mime_types a list of MIME types and
+    modified_after an RFC 3339 time such as '2024-05-01T00:00:00'. Drive matches name_contains
+    against the start of the words of a name, e.g. 'Invoice' matches 'Invoice 12.pdf' but 'voice'
+    does not.
+    """
+    clauses = [f"{quote(folder_id)} in parents", "trashed = false"]
+    filters = filters or {}
+    if filters.get('name_contains'):
+        clauses.append('(' + ' or '.join(f"name contains {quote(text)}" for text in filters['name_contains']) + ')')
+    if filters.get('mime_types'):
+        clauses.append('(' + ' or '.join(f"mimeType = {quote(mime_type)}" for mime_type in filters['mime_types']) + ')')
+    if filters.get('modified_after'):
+        clauses.append(f"modifiedTime > {quote(filters['modified_after'])}")
+    return ' and '.join(clauses)
+
+
+def _filter_key(filters):
+    filters = {name: value for name, value in (filters or {}).items() if name in FILTERS and value}
+    return json.dumps(filters, sort_keys=True) if filters else None
+
+
+# Filtered listings are only cached in memory, next to the full listing of their folder;
+# the persistent store and its Drive changes only hold full listings
+
+def _cached_listing(folder_id, filters=None):
+    key = _filter_key(filters)
+    if key is not None:
+        return cache.get('listings', (folder_id, key))
+    if store is not None:
+        return store.get_listing(folder_id)
+    return cache.get('listings', folder_id)
+
+
+def _save_listing(folder_id, files, filters=None):
+    key = _filter_key(filters)
+    if key is not None:
+        cache.set('listings', (folder_id, key), files)
+    elif store is not None:
+        store.save_listing(folder_id, files)
+    else:
+        cache.set('listings', folder_id, files)
+
+
+def _sync_store(service, progress=None):
+    if store is not None:
+        changes = store.sync(service)
+        if changes and progress:
+            progress(f"Synced {changes} Drive changes")
+
+
+def _list_request(service, folder_id, page_token=None, filters=None):
+    return service.files().list(q=files_query(folder_id, filters),
+                                fields=LIST_FIELDS,
+                                pageSize=PAGE_SIZE,
+                                pageToken=page_token)
+
+
+def list_files(service, folder_id, page_token=None, progress=None, filters=None):
+    """List all files in the Google Drive folder with pagination, as a linker.listing.Listing.
+
+    Trashed files are left out, and with filters (see files_query) so is every file that does not
+    pass them, on the server. With a persistent store enabled, a folder listed in an earlier
+    session is served from the store after syncing the Drive changes since then.
+    progress, if given, is called with a status message after each page.
+    """
+    _sync_store(service, progress)
+    # Check if folder files list is already cached
+    files = _cached_listing(folder_id, filters)
+    if files is not None:
+        return files
+
+    files = Listing()
+    while True:
+        response = execute_with_retry(_list_request(service, folder_id, page_token, filters))
+        files.extend(response.get('files', []))
+        if progress:
+            progress(f"Fetched {len(files)} files")
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+    # Cache the folder files list
+    _save_listing(folder_id, files, filters)
+    return files
+
+
+def list_files_many(service, folder_ids, on_folder=None, progress=None, filters=None):
+    """List several folders at once, fetching the pages of uncached folders in HTTP batches.
+
+    Each round sends the next page of every unfinished folder in one batch request, so a
+    folder summary costs about one round-trip per page instead of one per folder and page.
+    on_folder(folder_id, files), if given, is called as each listing completes. filters apply to
+    every folder, like those of list_files.
+    Returns (listings, errors): dicts of folder ID -> Listing and folder ID -> HttpError.
+    """
+    _sync_store(service, progress)
+    listings, errors = {}, {}
+    pages = {}  # folder ID -> page token of the folders still being fetched
+    for folder_id in dict.fromkeys(folder_ids):
+        files = _cached_listing(folder_id, filters)
+        if files is None:
+            pages[folder_id] = None
+            listings[folder_id] = Listing()
+        else:
+            listings[folder_id] = files
+            if on_folder:
+                on_folder(folder_id, files)
+
+    while pages:
+        responses, failed = execute_batch(service, {folder_id: _list_request(service, folder_id, page_token, filters)
+                                                    for folder_id, page_token in pages.items()})
+        for folder_id, error in failed.items():
+            errors[folder_id] = error
+            del listings[folder_id]
+            del pages[folder_id]
+        for folder_id, response in responses.items():
+            listings[folder_id].extend(response.get('files', []))
+            pages[folder_id] = response.get('nextPageToken')
+            if not pages[folder_id]:
+                del pages[folder_id]
+                _save_listing(folder_id, listings[folder_id], filters)
+                if on_folder:
+                    on_folder(folder_id, listings[folder_id])
+        if progress:
+            progress(f"Listed {len(listings) - len(pages)} of {len(listings)} folders")
+    return listings, errors
+
+
+def list_google_sheets(service, name_contains=None, on_page=None):
+    """List all Google Sheets in Google Drive, following every page, as dicts with id and name.
+
+    With name_contains only the sheets with a name word starting with that text are listed, by
+    Drive. on_page(sheets), if given, is called with the sheets of each page as it arrives.
+    The lists are cached.
+    """
+    key = ('name', name_contains.casefold()) if name_contains else 'all'
+    sheets = cache.get('sheets', key)
+    if sheets is not None:
+        return sheets
+
+    query = SHEETS_QUERY + (f" and name contains {quote(name_contains)}" if name_contains else '')
+    sheets = []
+    page_token = None
+    while True:
+        response = execute_with_retry(service.files().list(q=query, fields="nextPageToken, files(id, name)",
+                                                           pageSize=PAGE_SIZE, pageToken=page_token))
+        page = response.get('files', [])
+        sheets.extend(page)
+        if on_page:
+            on_page(page)
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+    cache.set('sheets', key, sheets)
+    return sheets
@@ -0,0 +1,522 @@
+"""In-process stand-in for the Google Drive and Sheets APIs, for offline testing and tuning.
+
+The emulator implements the subset of the APIs used by the linker: files.list (with the q
+clauses used here and pagination), changes.getStartPageToken/list, spreadsheets.get,
+spreadsheets.values.get/batchGet/batchUpdate and HTTP batch requests. Every round-trip can be
+slowed down by a fixed latency, and requests can fail with injected 429/5xx errors or exceed a
+per-minute quota, so retries and throughput can be measured without a Google account.
+
+It is selected with the LINKER_EMULATOR environment variable (or --emulator on the command
+line), a comma-separated list of settings such as
+
+    LINKER_EMULATOR="folders=20,files=5000,rows=100000,latency=0.15,error_rate=0.02"
+
+Any value, even an empty one like LINKER_EMULATOR=1, enables it with the default settings.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from linker.a1 import letter_to_column, split_range
+from linker.metrics import metrics
+from linker.scheduler import scheduler
+
+EMULATOR_ENV = 'LINKER_EMULATOR'
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+PDF_MIME_TYPE = 'application/pdf'
+
+# Settings and their defaults
+DEFAULTS = {
+    'seed': 1,
+    'folders': 5,          # synthetic document folders
+    'files': 200,          # documents per folder
+    'sheets': 2,           # synthetic spreadsheets, each with one 'Sheet1' tab
+    'rows': 1000,          # data rows per tab
+    'columns': 8,          # grid columns per tab, beyond Name, ID and Phone they are empty
+    'match_rate': 0.5,     # share of rows whose ID or phone matches a document
+    'page_size': 1000,     # largest files.list page served
+    'latency': 0.0,        # seconds per HTTP round-trip
+    'jitter': 0.0,         # extra random seconds per round-trip
+    'error_rate': 0.0,     # probability of an injected error per request
+    'error_statuses': '429/500/503',
+    'quota': 0,            # requests per minute per API before 429s, 0 for unlimited
+    'retry_delay': 0.01,   # base delay of execute(num_retries=...) retries
+}
+
+
+def parse_spec(spec):
+    """Parse 'key=value,key=value' emulator settings into a dict of typed values."""
+    settings = dict(DEFAULTS)
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        key, value = (part.strip() for part in item.split('=', 1))
+        if key not in DEFAULTS:
+            raise ValueError(f"Unknown emulator setting '{key}'")
+        settings[key] = type(DEFAULTS[key])(value)
+    return settings
+
+
+def from_env():
+    """Return an Emulator configured by LINKER_EMULATOR, or None if it is not set."""
+    spec = os.environ.get(EMULATOR_ENV)
+    return Emulator(**parse_spec(spec)) if spec is not None else None
+
+
+class _Response(dict):
+    """Stand-in for the httplib2.Response attached to an HttpError."""
+
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+        self.reason = {429: 'Too Many Requests', 404: 'Not Found', 400: 'Bad Request'}.get(status, 'Server Error')
+
+
+def http_error(status, message='', headers=None):
+    """Build an HttpError like the ones raised by googleapiclient."""
+    from googleapiclient.errors import HttpError
+    content = json.dumps({'error': {'code': status, 'message': message}}).encode()
+    return HttpError(_Response(status, headers), content, uri='emulator')
+
+
+class Request:
+    """A prepared API call, executed like googleapiclient.http.HttpRequest."""
+
+    def __init__(self, emulator, api, handler, name):
+        self.emulator = emulator
+        self.api = api
+        self.handler = handler
+        self.name = name  # operation name in linker.metrics, e.g. 'drive GET files'
+
+    def execute(self, num_retries=0):
+        from googleapiclient.errors import HttpError
+        for attempt in range(num_retries + 1):
+            scheduler.acquire(self.name)
+            start = time.perf_counter()
+            self.emulator.round_trip()
+            try:
+                response = self.emulator.call(self.api, self.handler)
+            except HttpError as error:
+                metrics.record_call(self.name, time.perf_counter() - start, error=True)
+                scheduler.release(self.name, error.resp.status, error.resp)
+                if attempt == num_retries or error.resp.status not in (429, 500, 502, 503, 504):
+                    raise
+                time.sleep(random.random() * 2 ** attempt * self.emulator.settings['retry_delay'])
+                continue
+            metrics.record_call(self.name, time.perf_counter() - start, bytes_received=len(json.dumps(response)))
+            scheduler.release(self.name, 200)
+            return response
+
+
+class BatchRequest:
+    """Stand-in for googleapiclient.http.BatchHttpRequest: one round-trip, one result per call."""
+
+    def __init__(self, emulator, api, callback=None):
+        self.emulator = emulator
+        self.api = api
+        self.callback = callback
+        self._calls = []
+
+    def add(self, request, callback=None, request_id=None):
+        request_id = request_id if request_id is not None else str(len(self._calls) + 1)
+        self._calls.append((request_id, request, callback))
+
+    def execute(self):
+        from googleapiclient.errors import HttpError
+        name = f"{self.api} POST batch"
+        scheduler.acquire(name, max(1, len(self._calls)))
+        start = time.perf_counter()
+        self.emulator.round_trip()
+        results = []
+        for request_id, request, callback in self._calls:
+            try:
+                response, exception = self.emulator.call(self.api, request.handler), None
+            except HttpError as error:
+                response, exception = None, error
+            results.append((request_id, response, exception, callback))
+        metrics.record_call(name, time.perf_counter() - start,
+                            bytes_received=sum(len(json.dumps(result[1])) for result in results))
+        scheduler.release(name, 200)
+        for request_id, response, exception, callback in results:
+            for handler in (callback, self.callback):
+                if handler:
+                    handler(request_id, response, exception)
+
+
+class Emulator:
+    """Synthetic Drive and Sheets data and the service objects serving it.
+
+    The data set is generated from the seed: `folders` folders of `files` documents named
+    '<number># Document.pdf', and `sheets` spreadsheets with a Name, ID (column B) and Phone
+    (column C) column, whose ID or phone matches a document for about match_rate of their rows.
+    """
+
+    def __init__(self, **settings):
+        self.settings = dict(DEFAULTS, **settings)
+        self.stats = {'requests': 0, 'round_trips': 0, 'errors': 0}
+        self._lock = threading.RLock()
+        self._window = {}     # api -> (minute, requests) for the quota
+        self.files = {}       # file ID -> file resource
+        self.children = {}    # folder ID -> [file ID] in creation order
+        self.spreadsheets = {}  # spreadsheet ID -> {'title', 'tabs': {title: [[value]]}}
+        self.changes = []     # change resources, the page token is an index into this list
+        self._clock = 0
+        self._generate()
+
+    # Data set
+
+    def _now(self):
+        self._clock += 1
+        return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(1600000000 + self._clock)) + '.000Z'
+
+    def add_file(self, name, parent, mime_type=PDF_MIME_TYPE, file_id=None):
+        """Create a file in a folder, recording a change like Drive does. Returns the file resource."""
+        with self._lock:
+            file_id = file_id or f"file{len(self.files):07d}"
+            file = {'id': file_id, 'name': name, 'mimeType': mime_type, 'parents': [parent],
+                    'trashed': False, 'modifiedTime': self._now()}
+            self.files[file_id] = file
+            self.children.setdefault(parent, []).append(file_id)
+            self.changes.append({'fileId': file_id, 'removed': False, 'file': dict(file)})
+            return file
+
+    def trash_file(self, file_id):
+        """Move a file to the trash, recording a change."""
+        with self._lock:
+            file = self.files[file_id]
+            file['trashed'] = True
+            file['modifiedTime'] = self._now()
+            self.changes.append({'fileId': file_id, 'removed': False, 'file': dict(file)})
+
+    def add_spreadsheet(self, title, tabs, spreadsheet_id=None):
+        """Create a spreadsheet from {tab title: rows of values}. Returns its ID."""
+        with self._lock:
+            spreadsheet_id = spreadsheet_id or f"sheet{len(self.spreadsheets):04d}"
+            self.spreadsheets[spreadsheet_id] = {'title': title, 'tabs': tabs,
+                                                 'columns': {tab: self.settings['columns'] for tab in tabs}}
+            self.add_file(title, 'root', SPREADSHEET_MIME_TYPE, file_id=spreadsheet_id)
+            return spreadsheet_id
+
+    def _generate(self):
+        rng = random.Random(self.settings['seed'])
+        numbers = []
+        for folder in range(self.settings['folders']):
+            folder_id = self.add_file(f"Folder {folder + 1}", 'root', FOLDER_MIME_TYPE, f"folder{folder:04d}")['id']
+            for _ in range(self.settings['files']):
+                number = str(rng.randrange(10 ** 5, 10 ** 9))
+                numbers.append(number)
+                self.add_file(f"{number}# Document.pdf", folder_id)
+
+        for sheet in range(self.settings['sheets']):
+            rows = [['Name', 'ID', 'Phone']]
+            for row in range(self.settings['rows']):
+                identifier = str(rng.randrange(10 ** 5, 10 ** 9))
+                phone = '07' + str(rng.randrange(10 ** 7, 10 ** 8))
+                if numbers and rng.random() < self.settings['match_rate']:
+                    if rng.random() < 0.5:
+                        identifier = '00' + rng.choice(numbers)
+                    else:
+                        phone = rng.choice(numbers)
+                rows.append([f"Person {row + 1}", identifier, phone])
+            self.add_spreadsheet(f"Sheet {sheet + 1}", {'Sheet1': rows})
+        self.changes.clear()
+
+    # Transport
+
+    def limits(self):
+        """Return linker.scheduler limits keeping within the quota setting (0: no limits)."""
+        quota = self.settings['quota']
+        return {'drive_read': quota, 'sheets_read': quota and max(1, quota // 2),
+                'sheets_write': quota and max(1, quota // 2)}
+
+    def round_trip(self):
+        """Sleep for the latency of one HTTP round-trip."""
+        with self._lock:
+            self.stats['round_trips'] += 1
+        delay = self.settings['latency'] + random.uniform(0, self.settings['jitter'])
+        if delay:
+            time.sleep(delay)
+
+    def call(self, api, handler):
+        """Run one API call, injecting quota and random errors."""
+        with self._lock:
+            self.stats['requests'] += 1
+            minute = int(time.monotonic() // 60)
+            window, used = self._window.get(api, (minute, 0))
+            used = used + 1 if window == minute else 1
+            self._window[api] = (minute, used)
+            if self.settings['quota'] and used > self.settings['quota']:
+                self.stats['errors'] += 1
+                raise http_error(429, 'Quota exceeded', {'retry-after': str(60 - int(time.monotonic() % 60))})
+            if random.random() < self.settings['error_rate']:
+                self.stats['errors'] += 1
+                status = int(random.choice(self.settings['error_statuses'].split('/')))
+                raise http_error(status, 'Injected error')
+            return handler()
+
+    def service(self, name, version=None):
+        """Return the service object of an API, like googleapiclient.discovery.build."""
+        if name == 'drive':
+            return DriveService(self)
+        if name == 'sheets':
+            return SheetsService(self)
+        raise ValueError(f"The emulator does not implement the {name} API")
+
+
+# Drive
+
+QUERY_CLAUSE = re.compile(
+    r"\s*(?:(?P<not>not)\s+)?(?:"
+    r"'(?P<parent>[^']*)'\s+in\s+parents"
+    r"|(?P<field>mimeType|name|modifiedTime|trashed)\s*(?P<op>!=|=|>=|<=|>|<|contains)\s*"
+    r"(?:'(?P<value>(?:[^'\\]|\\.)*)'|(?P<bool>true|false))"
+    r")\s*")
+
+
+def _split_top(query, word):
+    """Split a query on a boolean operator outside parentheses and quotes."""
+    parts, depth, quoted, start = [], 0, False, 0
+    index = 0
+    while index < len(query):
+        char = query[index]
+        if char == "'" and (index == 0 or query[index - 1] != '\\'):
+            quoted = not quoted
+        elif not quoted and char in '()':
+            depth += 1 if char == '(' else -1
+        elif not quoted and depth == 0 and query.startswith(f" {word} ", index):
+            parts.append(query[start:index])
+            index += len(word) + 2
+            start = index
+            continue
+        index += 1
+    parts.append(query[start:])
+    return parts
+
+
+def matches_query(file, query):
+    """Evaluate a files.list q expression (and/or, parentheses and the clauses used here) on a file."""
+    query = query.strip()
+    alternatives = _split_top(query, 'or')
+    if len(alternatives) > 1:
+        return any(matches_query(file, part) for part in alternatives)
+    terms = _split_top(query, 'and')
+    if len(terms) > 1:
+        return all(matches_query(file, part) for part in terms)
+    if query.startswith('(') and query.endswith(')'):
+        return matches_query(file, query[1:-1])
+    if query.startswith('not ('):
+        return not matches_query(file, query[4:])
+
+    clause = QUERY_CLAUSE.fullmatch(query)
+    if not clause:
+        raise http_error(400, f"Invalid Value: {query}")
+    if clause['parent'] is not None:
+        result = clause['parent'] in file['parents']
+    else:
+        actual = file[clause['field']]
+        expected = clause['bool'] == 'true' if clause['bool'] else clause['value'].replace("\\'", "'")
+        op = clause['op']
+        if op == 'contains':
+            result = expected.lower() in actual.lower()
+        elif op == '=':
+            result = actual == expected
+        elif op == '!=':
+            result = actual != expected
+        else:
+            result = {'>': actual > expected, '<': actual < expected,
+                      '>=': actual >= expected, '<=': actual <= expected}[op]
+    return not result if clause['not'] else result
+
+
+class DriveService:
+    """Drive v3 subset: files.list, changes.getStartPageToken, changes.list and batches."""
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+
+    def files(self):
+        return self
+
+    def changes(self):
+        return _Changes(self.emulator)
+
+    def new_batch_http_request(self, callback=None):
+        return BatchRequest(self.emulator, 'drive', callback)
+
+    def list(self, q='', fields=None, pageSize=100, pageToken=None, **kwargs):
+        emulator = self.emulator
+
+        def handler():
+            with emulator._lock:
+                parent = re.fullmatch(r"'([^']*)' in parents(?: and .*)?", q or '')
+                if parent and ' or ' not in q:
+                    candidates = emulator.children.get(parent.group(1), [])
+                else:
+                    candidates = list(emulator.files)
+                found = [emulator.files[file_id] for file_id in candidates
+                         if not q or matches_query(emulator.files[file_id], q)]
+            size = min(pageSize or 100, 1000, emulator.settings['page_size'])
+            start = int(pageToken or 0)
+            page = found[start:start + size]
+            response = {'files': [_select(file, fields) for file in page]}
+            if start + size < len(found):
+                response['nextPageToken'] = str(start + size)
+            return response
+        return Request(emulator, 'drive', handler, 'drive GET files')
+
+
+def _select(file, fields):
+    """Keep the file fields named in a files(...) field mask."""
+    mask = re.search(r'files\(([^)]*)\)', fields or '')
+    if not mask:
+        return {key: file[key] for key in ('id', 'name', 'mimeType')}
+    return {key: file[key] for key in (name.strip() for name in mask.group(1).split(',')) if key in file}
+
+
+class _Changes:
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+
+    def getStartPageToken(self, **kwargs):
+        return Request(self.emulator, 'drive', lambda: {'startPageToken': str(len(self.emulator.changes))},
+                       'drive GET startPageToken')
+
+    def list(self, pageToken, pageSize=100, **kwargs):
+        emulator = self.emulator
+
+        def handler():
+            with emulator._lock:
+                start = int(pageToken)
+                page = emulator.changes[start:start + pageSize]
+                end = start + len(page)
+                response = {'changes': [dict(change) for change in page]}
+                if end < len(emulator.changes):
+                    response['nextPageToken'] = str(end)
+                else:
+                    response['newStartPageToken'] = str(end)
+                return response
+        return Request(emulator, 'drive', handler, 'drive GET changes')
+
+
+# Sheets
+
+A1_PART = re.compile(r'^([A-Z]*)(\d*)$')
+
+
+def _parse_range(range_name):
+    """Split an A1 range into (tab, first column, first row, last column, last row); None means open."""
+    tab, cells = split_range(range_name)
+    first, _, last = cells.upper().partition(':')
+    first_column, first_row = A1_PART.match(first).groups()
+    last_column, last_row = A1_PART.match(last or first).groups()
+    return (tab, letter_to_column(first_column) if first_column else 1, int(first_row or 1),
+            letter_to_column(last_column) if last_column else None, int(last_row) if last_row else None)
+
+
+class SheetsService:
+    """Sheets v4 subset: spreadsheets.get, values.get/batchGet/batchUpdate and batches."""
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return _Values(self.emulator)
+
+    def new_batch_http_request(self, callback=None):
+        return BatchRequest(self.emulator, 'sheets', callback)
+
+    def get(self, spreadsheetId, fields=None, **kwargs):
+        emulator = self.emulator
+
+        def handler():
+            spreadsheet = _spreadsheet(emulator, spreadsheetId)
+            with emulator._lock:
+                tabs = [{'properties': {'sheetId': index, 'title': title, 'index': index,
+                                        'gridProperties': {'rowCount': max(len(rows), 1000),
+                                                           'columnCount': spreadsheet['columns'][title]}}}
+                        for index, (title, rows) in enumerate(spreadsheet['tabs'].items())]
+            return {'spreadsheetId': spreadsheetId, 'properties': {'title': spreadsheet['title']}, 'sheets': tabs}
+        return Request(emulator, 'sheets', handler, 'sheets GET spreadsheets')
+
+
+def _spreadsheet(emulator, spreadsheet_id):
+    spreadsheet = emulator.spreadsheets.get(spreadsheet_id)
+    if spreadsheet is None:
+        raise http_error(404, 'Requested entity was not found.')
+    return spreadsheet
+
+
+class _Values:
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+
+    def _read(self, spreadsheet_id, range_name, major_dimension='ROWS'):
+        tab, first_column, first_row, last_column, last_row = _parse_range(range_name)
+        spreadsheet = _spreadsheet(self.emulator, spreadsheet_id)
+        if tab not in spreadsheet['tabs']:
+            raise http_error(400, f"Unable to parse range: {range_name}")
+        with self.emulator._lock:
+            rows = spreadsheet['tabs'][tab]
+            last_row = min(last_row or len(rows), len(rows))
+            last_column = last_column or spreadsheet['columns'][tab]
+            values = [[row[column - 1] if column - 1 < len(row) and row[column - 1] is not None else ''
+                       for column in range(first_column, last_column + 1)]
+                      for row in rows[first_row - 1:last_row]]
+        if major_dimension == 'COLUMNS':
+            values = [list(column) for column in zip(*values)] if values else []
+        # The API leaves out trailing empty cells and rows
+        for line in values:
+            while line and line[-1] == '':
+                line.pop()
+        while values and not values[-1]:
+            values.pop()
+        result = {'range': range_name, 'majorDimension': major_dimension}
+        if values:
+            result['values'] = values
+        return result
+
+    def get(self, spreadsheetId, range, majorDimension='ROWS', **kwargs):
+        return Request(self.emulator, 'sheets', lambda: self._read(spreadsheetId, range, majorDimension),
+                       'sheets GET values')
+
+    def batchGet(self, spreadsheetId, ranges, majorDimension='ROWS', **kwargs):
+        return Request(self.emulator, 'sheets', lambda: {
+            'spreadsheetId': spreadsheetId,
+            'valueRanges': [self._read(spreadsheetId, range_name, majorDimension) for range_name in ranges]},
+            'sheets GET values:batchGet')
+
+    def batchUpdate(self, spreadsheetId, body):
+        emulator = self.emulator
+
+        def handler():
+            spreadsheet = _spreadsheet(emulator, spreadsheetId)
+            updated = 0
+            with emulator._lock:
+                for value_range in body.get('data', []):
+                    tab, first_column, first_row, _, _ = _parse_range(value_range['range'])
+                    if tab not in spreadsheet['tabs']:
+                        raise http_error(400, f"Unable to parse range: {value_range['range']}")
+                    rows = spreadsheet['tabs'][tab]
+                    for row_offset, line in enumerate(value_range['values']):
+                        for column_offset, value in enumerate(line):
+                            if value is None:
+                                continue
+                            row, column = first_row + row_offset, first_column + column_offset
+                            rows.extend([] for _ in range(row - len(rows)))
+                            cells = rows[row - 1]
+                            cells.extend('' for _ in range(column - len(cells)))
+                            cells[column - 1] = value
+                            spreadsheet['columns'][tab] = max(spreadsheet['columns'][tab], column)
+                            updated += 1
+            return {'spreadsheetId': spreadsheetId, 'totalUpdatedCells': updated}
+        return Request(emulator, 'sheets', handler, 'sheets POST values:batchUpdate')
+
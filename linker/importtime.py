@@ -0,0 +1,40 @@
+"""Startup import time measurements with python -X importtime."""
+import subprocess
+import sys
+from linker import PROJECT_DIR
+
+# Modules imported by url_linking_main.py before its window appears
+STARTUP_MODULES = ['tkinter', 'tkinter.ttk', 'linker.catalog', 'linker.crawler', 'linker.drive', 'linker.metrics',
+                   'linker.pipeline', 'linker.results', 'linker.results_view', 'linker.services', 'linker.store',
+                   'linker.sheets', 'linker.tasks']
+
+
+def measure(modules=STARTUP_MODULES):
+    """Import modules in a fresh interpreter under -X importtime.
+
+    Returns (total microseconds, {module: (self us, cumulative us)}) for every module imported.
+    """
+    code = '; '.join(f"import {module}" for module in modules)
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                             cwd=PROJECT_DIR)
+    if process.returncode:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        times[module.strip()] = (int(self_us), int(cumulative_us))
+    return sum(self_us for self_us, _ in times.values()), times
+
+
+def format_times(total, times, top=15):
+    """Format the total import time and the slowest top-level packages as text."""
+    packages = {}
+    for module, (self_us, _) in times.items():
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    lines = [f"Total import time: {total / 1000:.1f} ms ({len(times)} modules)"]
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"{self_us / 1000:9.1f} ms  {package}")
+    return '\n'.join(lines)
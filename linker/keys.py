@@ -0,0 +1,98 @@
+"""Rules extracting document keys from Drive file names."""
+import re
+from collections import namedtuple
+
+
+def strip_zeros(value):
+    """Normalize a number by removing surrounding blanks and leading zeros."""
+    return str(value).strip().lstrip('0')
+
+
+def digits_only(value):
+    """Normalize a number by keeping only its digits, without leading zeros."""
+    return re.sub(r'\D', '', str(value)).lstrip('0')
+
+
+def casefold(value):
+    """Normalize a text key for case-insensitive comparison."""
+    return str(value).strip().casefold()
+
+
+def verbatim(value):
+    """Compare a key as is, apart from surrounding blanks."""
+    return str(value).strip()
+
+
+NORMALIZERS = {
+    'strip_zeros': strip_zeros,
+    'digits': digits_only,
+    'casefold': casefold,
+    'none': verbatim,
+}
+
+
+class KeyRule(namedtuple('KeyRule', ['name', 'pattern', 'normalize'])):
+    """A precompiled file name pattern whose 'key' group (or first group) is the document number."""
+    __slots__ = ()
+
+    @classmethod
+    def compile(cls, pattern, normalize='strip_zeros', name=None):
+        """Build a rule from a regular expression and the name of a normalizer."""
+        if normalize not in NORMALIZERS:
+            raise ValueError(f"Unknown normalization '{normalize}', expected one of {', '.join(NORMALIZERS)}")
+        compiled = re.compile(pattern)
+        if not compiled.groups:
+            raise ValueError(f"Key pattern '{pattern}' has no group to extract")
+        return cls(name or pattern, compiled, NORMALIZERS[normalize])
+
+    def extract(self, file_name):
+        """Return the raw key found in a file name, or None."""
+        match = self.pattern.search(file_name)
+        if not match:
+            return None
+        return match.group('key') if 'key' in self.pattern.groupindex else match.group(1)
+
+
+# Document numbers are the digits in front of the '#' in a file name, e.g. '00123#scan.pdf'
+DEFAULT_RULES = (KeyRule.compile(r'(?P<key>\d+)#', name='number_hash'),)
+
+
+class KeyExtractor:
+    """Parses document keys out of file names with an ordered list of rules (first match wins).
+
+    A linker.listing.Listing caches the keys parsed with a rule set, identified by signature.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = tuple(rules)
+        self.signature = tuple((rule.pattern.pattern, rule.normalize.__name__) for rule in self.rules)
+        self.normalizers = tuple(dict.fromkeys(rule.normalize for rule in self.rules))
+
+    @classmethod
+    def from_specs(cls, specs):
+        """Build an extractor from pattern strings or dicts with pattern, normalize and name keys."""
+        if not specs:
+            return default_extractor
+        rules = []
+        for spec in specs:
+            if isinstance(spec, str):
+                spec = {'pattern': spec}
+            rules.append(KeyRule.compile(spec['pattern'], spec.get('normalize', 'strip_zeros'), spec.get('name')))
+        return cls(rules)
+
+    def parse(self, file_name):
+        """Return (raw, key) of a file name, or (None, None) if no rule yields a key."""
+        for rule in self.rules:
+            raw = rule.extract(file_name)
+            if raw is not None:
+                key = rule.normalize(raw)
+                if key:
+                    return raw, key
+        return None, None
+
+    def cell_keys(self, value):
+        """Return the keys a sheet cell can match, one per normalization used by the rules."""
+        return {key for key in (normalize(value) for normalize in self.normalizers) if key}
+
+
+default_extractor = KeyExtractor()
@@ -0,0 +1,206 @@
+"""Compact, columnar folder listings."""
+import sys
+from array import array
+from bisect import bisect_right
+
+# Key codes of the key column: a code >= 0 is the key itself, NO_KEY marks a file without one
+# and lower codes point into the list of keys that are not canonical integers
+NO_KEY = -1
+MAX_INT_KEY = 2 ** 63 - 1
+
+# Characters a StringArena joins into one segment before starting the next
+SEGMENT_SIZE = 1 << 16
+
+
+def compact_key(key):
+    """Return a canonical decimal key as an int ('123' -> 123) and any other key unchanged."""
+    if key.isascii() and key.isdigit() and (key[0] != '0' or len(key) == 1) and int(key) <= MAX_INT_KEY:
+        return int(key)
+    return key
+
+
+class StringArena:
+    """Append-only column of strings stored in a few long segments with an array of end offsets.
+
+    The strings appended between two reads are joined into a new segment, or onto the last one
+    while it is shorter than SEGMENT_SIZE, so filling an arena page by page never copies it whole.
+    """
+
+    __slots__ = ('_segments', '_starts', '_pending', '_ends')
+
+    def __init__(self, strings=()):
+        self._segments = []
+        self._starts = array('Q')  # offset of the first character of each segment
+        self._pending = []
+        self._ends = array('Q')
+        for string in strings:
+            self.append(string)
+        self.flush()
+
+    def append(self, string):
+        self._pending.append(string)
+        self._ends.append((self._ends[-1] if self._ends else 0) + len(string))
+
+    def flush(self):
+        """Join the strings appended since the last read into the arena."""
+        if self._pending:
+            text = ''.join(self._pending)
+            self._pending = []
+            if self._segments and len(self._segments[-1]) < SEGMENT_SIZE:
+                self._segments[-1] += text
+            else:
+                self._starts.append(self._starts[-1] + len(self._segments[-1]) if self._segments else 0)
+                self._segments.append(text)
+
+    def __len__(self):
+        return len(self._ends)
+
+    def __getitem__(self, position):
+        self.flush()
+        start = self._ends[position - 1] if position else 0
+        end = self._ends[position]
+        if start == end:
+            return ''
+        segment = bisect_right(self._starts, start) - 1
+        offset = self._starts[segment]
+        return self._segments[segment][start - offset:end - offset]
+
+    def __iter__(self):
+        self.flush()
+        start, segment = 0, -1
+        text, offset, next_start = '', 0, 0
+        for end in self._ends:
+            while start >= next_start and segment + 1 < len(self._segments):
+                segment += 1
+                text, offset = self._segments[segment], self._starts[segment]
+                next_start = offset + len(text)
+            yield text[start - offset:end - offset]
+            start = end
+
+    def __sizeof__(self):
+        self.flush()
+        return (object.__sizeof__(self) + sys.getsizeof(self._segments) + sys.getsizeof(self._starts)
+                + sum(sys.getsizeof(segment) for segment in self._segments) + sys.getsizeof(self._ends))
+
+
+class Listing:
+    """Files of a folder stored column by column, in listing order.
+
+    IDs and names live in StringArenas, MIME types as two-byte codes into a table of interned
+    types, and the document keys parsed by a linker.keys.KeyExtractor in an integer column,
+    so a listing of millions of files holds no per-file Python objects.
+    """
+
+    __slots__ = ('_ids', '_names', '_mime_codes', '_mime_types', '_keys')
+
+    def __init__(self, files=()):
+        self._ids = StringArena()
+        self._names = StringArena()
+        self._mime_codes = array('H')
+        self._mime_types = []
+        self._keys = None  # (rule signature, key codes, non-integer keys, labels)
+        self.extend(files)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a listing from (file ID, name, MIME type) tuples."""
+        listing = cls()
+        for file_id, name, mime_type in rows:
+            listing.append(file_id, name, mime_type)
+        listing.flush()
+        return listing
+
+    def append(self, file_id, name, mime_type=None):
+        """Add one file."""
+        mime_type = sys.intern(mime_type or '')
+        if mime_type not in self._mime_types:
+            self._mime_types.append(mime_type)
+        self._ids.append(file_id)
+        self._names.append(name)
+        self._mime_codes.append(self._mime_types.index(mime_type))
+        self._keys = None
+
+    def extend(self, files):
+        """Add files given as API resources (dicts with id, name and mimeType)."""
+        for file in files:
+            self.append(file['id'], file['name'], file.get('mimeType'))
+        self.flush()
+
+    def flush(self):
+        """Finish a series of appends, so the listing can be read from several threads."""
+        self._ids.flush()
+        self._names.flush()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def id(self, position):
+        return self._ids[position]
+
+    def name(self, position):
+        return self._names[position]
+
+    def mime_type(self, position):
+        return self._mime_types[self._mime_codes[position]] or None
+
+    def rows(self):
+        """Yield (file ID, name, MIME type) of every file."""
+        for file_id, name, code in zip(self._ids, self._names, self._mime_codes):
+            yield file_id, name, self._mime_types[code] or None
+
+    def to_dicts(self):
+        """Return the files as API-style dicts."""
+        return [{'id': file_id, 'name': name, 'mimeType': mime_type} for file_id, name, mime_type in self.rows()]
+
+    def count(self, mime_type=None, exclude=None):
+        """Count the files of a MIME type, or of every type but exclude."""
+        codes = range(len(self._mime_types))
+        if mime_type is not None:
+            codes = [code for code in codes if self._mime_types[code] == mime_type]
+        if exclude is not None:
+            codes = [code for code in codes if self._mime_types[code] != exclude]
+        return sum(self._mime_codes.count(code) for code in codes)
+
+    def ids(self, mime_type):
+        """Return the IDs of the files of a MIME type."""
+        if mime_type not in self._mime_types:
+            return []
+        code = self._mime_types.index(mime_type)
+        return [self._ids[position] for position, file_code in enumerate(self._mime_codes) if file_code == code]
+
+    def keys(self, extractor):
+        """Return (key codes, non-integer keys, labels), parsing the names only once per rule set.
+
+        The code of a file is its compact key when that is an int, NO_KEY when it has no key,
+        and -2 - i for the i-th non-integer key. labels maps the position of every file whose
+        number is written differently from its key (e.g. '00123' for 123) to that number.
+        """
+        # Listings are shared between threads: read the cached keys once and return only locals
+        cached = self._keys
+        if cached is not None and cached[0] == extractor.signature:
+            return cached[1:]
+        codes, text_keys, labels = array('q'), [], {}
+        for position, name in enumerate(self._names):
+            raw, key = extractor.parse(name)
+            if key is None:
+                codes.append(NO_KEY)
+                continue
+            if raw != key:
+                labels[position] = raw
+            key = compact_key(key)
+            if isinstance(key, int):
+                codes.append(key)
+            else:
+                codes.append(-2 - len(text_keys))
+                text_keys.append(key)
+        self._keys = (extractor.signature, codes, text_keys, labels)
+        return codes, text_keys, labels
+
+    def __sizeof__(self):
+        size = object.__sizeof__(self) + sys.getsizeof(self._ids) + sys.getsizeof(self._names)
+        size += sys.getsizeof(self._mime_codes) + sys.getsizeof(self._mime_types)
+        cached = self._keys
+        if cached is not None:
+            size += sys.getsizeof(cached[1]) + sum(sys.getsizeof(key) for key in cached[2])
+            size += sys.getsizeof(cached[3]) + sum(sys.getsizeof(label) for label in cached[3].values())
+        return size
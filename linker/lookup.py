@@ -0,0 +1,83 @@
+"""Lookup index over sheet cells for exact, prefix and contained-number matches."""
+from array import array
+from bisect import bisect_left
+
+# Length of the n-grams indexed for contained-number lookups
+NGRAM = 3
+
+MATCH_MODES = ('exact', 'prefix', 'contains')
+
+
+class CellIndex:
+    """Index of normalized sheet cell values and the (row, column) they came from.
+
+    Cells must be added in sheet order. Every lookup returns the earliest cell that matches:
+    exact lookups use a dict, prefix lookups bisect a sorted list of values and contained
+    lookups intersect the posting lists of the key's n-grams before checking the candidates.
+    """
+
+    def __init__(self, ngram=NGRAM):
+        self.ngram = ngram
+        self.texts = []        # entry -> normalized value
+        self.cells = []        # entry -> (row, column)
+        self.exact = {}        # value -> first entry
+        self.grams = {}        # n-gram -> array of entries, ascending
+        self._sorted = None    # [(value, entry)] for prefix lookups, built on first use
+
+    def add(self, text, row, column):
+        """Index one normalized cell value."""
+        if not text:
+            return
+        entry = len(self.texts)
+        self.texts.append(text)
+        self.cells.append((row, column))
+        self.exact.setdefault(text, entry)
+        for gram in {text[start:start + self.ngram] for start in range(max(1, len(text) - self.ngram + 1))}:
+            postings = self.grams.get(gram)
+            if postings is None:
+                postings = self.grams[gram] = array('I')
+            postings.append(entry)
+        self._sorted = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def lookup(self, key, mode='exact'):
+        """Return the (row, column) of the earliest cell matching key, or None.
+
+        mode is 'exact', 'prefix' (the cell starts with key) or 'contains' (the cell contains key).
+        An exact match always wins over a partial one.
+        """
+        entry = self.exact.get(key)
+        if entry is None and mode == 'prefix':
+            entry = self._first_prefix(key)
+        elif entry is None and mode == 'contains':
+            entry = self._first_containing(key)
+        return self.cells[entry] if entry is not None else None
+
+    def _first_prefix(self, key):
+        if self._sorted is None:
+            self._sorted = sorted(zip(self.texts, range(len(self.texts))))
+        first = None
+        position = bisect_left(self._sorted, (key,))
+        while position < len(self._sorted) and self._sorted[position][0].startswith(key):
+            entry = self._sorted[position][1]
+            if first is None or entry < first:
+                first = entry
+            position += 1
+        return first
+
+    def _first_containing(self, key):
+        if len(key) < self.ngram:
+            # Too short for the n-grams: scan the values in sheet order
+            return next((entry for entry, text in enumerate(self.texts) if key in text), None)
+        grams = {key[start:start + self.ngram] for start in range(len(key) - self.ngram + 1)}
+        postings = sorted((self.grams.get(gram, ()) for gram in grams), key=len)
+        if not postings or not postings[0]:
+            return None
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                return None
+        return next((entry for entry in sorted(candidates) if key in self.texts[entry]), None)
@@ -0,0 +1,171 @@
+"""Match Google Drive documents against the ID and phone columns of a Google Sheet."""
+import re
+from collections import namedtuple
+from linker.keys import default_extractor, digits_only, verbatim
+from linker.listing import NO_KEY, Listing, compact_key
+from linker.lookup import MATCH_MODES, CellIndex
+
+# One matched document and the Google Sheets cell it belongs to
+Match = namedtuple('Match', ['index', 'file_name', 'file_id', 'url', 'row', 'column', 'gs_name'])
+
+FILE_URL = re.compile(r'^https://drive\.google\.com/file/d/[a-zA-Z0-9_-]+/view$')
+
+
+def file_url(file_id):
+    """Build the Drive viewer URL of a file."""
+    return f"https://drive.google.com/file/d/{file_id}/view"
+
+
+def is_file_url(value):
+    """Whether a cell value is a Drive viewer URL as pasted by the linker."""
+    return bool(FILE_URL.match(value))
+
+
+# Phone numbers compare as they are
+normalize_phone = verbatim
+
+
+class DocumentIndex:
+    """Positions of the files of a Listing by document key, in listing order.
+
+    Keys are compact (see linker.listing.compact_key). A key's first file is stored as a plain
+    position; the positions of further files with the same key are kept in duplicates. labels
+    holds the numbers written differently from their keys, as parsed by Listing.keys.
+    """
+
+    __slots__ = ('listing', 'extractor', 'first', 'duplicates', 'labels')
+
+    def __init__(self, listing, extractor):
+        self.listing = listing
+        self.extractor = extractor
+        self.first = {}
+        self.duplicates = {}
+        codes, text_keys, self.labels = listing.keys(extractor)
+        for position, code in enumerate(codes):
+            if code == NO_KEY:
+                continue
+            key = code if code >= 0 else text_keys[-2 - code]
+            if key in self.first:
+                self.duplicates.setdefault(key, []).append(position)
+            else:
+                self.first[key] = position
+
+    def __len__(self):
+        return len(self.first)
+
+    def __contains__(self, key):
+        return compact_key(key) in self.first
+
+    def positions(self, key):
+        """Return the listing positions of the files with a (compact) key."""
+        return [self.first[key]] + self.duplicates.get(key, [])
+
+    def label(self, position, key):
+        """Return the number of the file at position as written in its name."""
+        return self.labels.get(position, str(key))
+
+
+def build_document_index(files, extractor=None):
+    """Index a folder listing (a linker.listing.Listing or a list of file dicts) by document key.
+
+    extractor is a linker.keys.KeyExtractor (the 'digits#' rule by default).
+    """
+    if not isinstance(files, Listing):
+        files = Listing(files)
+    return DocumentIndex(files, extractor or default_extractor)
+
+
+def match_rows(document_index, rows, id_column, phone_column, extractor=None, mode='exact'):
+    """Match an indexed folder against a stream of sheet rows.
+
+    rows yields (row_number, id_value, phone_value) in sheet order. A document matches the
+    earliest row whose normalized ID or phone number equals its number, preferring the ID
+    column on the same row. ID cells are normalized like the document keys of extractor.
+
+    In 'exact' mode the sheet never has to be held in memory: only the first row holding each
+    document number is kept. The 'prefix' and 'contains' modes also accept cells starting with
+    or containing the number (e.g. '12345-B' or a formatted phone number '+254 712-345 678'),
+    through a linker.lookup.CellIndex over all the cells; an exact match still wins.
+    Returns a list of Match records, one per matching file.
+    """
+    extractor = extractor or default_extractor
+    if mode == 'exact':
+        found = _find_exact(document_index, rows, id_column, phone_column, extractor)
+    else:
+        found = _find_partial(document_index, rows, id_column, phone_column, extractor, mode)
+    return _matches(document_index, found)
+
+
+def index_cells(rows, id_column, phone_column, extractor=None, mode='exact'):
+    """Index sheet rows by the normalized values of their ID and phone cells, for match_cells.
+
+    rows yields (row_number, id_value, phone_value) in sheet order; extractor and mode must be
+    those the documents will be matched with.
+    Returns a linker.lookup.CellIndex.
+    """
+    if mode not in MATCH_MODES:
+        raise ValueError(f"Unknown match mode '{mode}', expected one of {', '.join(MATCH_MODES)}")
+    extractor = extractor or default_extractor
+    index = CellIndex()
+    for row_number, id_value, phone_value in rows:
+        for key in extractor.cell_keys(id_value):
+            index.add(key, row_number, id_column)
+        # Outside exact mode formatted phone numbers are also indexed by their digits
+        phone_keys = [normalize_phone(phone_value)] + ([digits_only(phone_value)] if mode != 'exact' else [])
+        for key in dict.fromkeys(phone_keys):
+            index.add(key, row_number, phone_column)
+    return index
+
+
+def match_cells(document_index, cell_index, mode='exact'):
+    """Match an indexed folder against sheet rows indexed by index_cells, like match_rows.
+
+    The sheet is indexed once and can be matched against many small document indexes, such as
+    the files added to a folder since the last look.
+    Returns a list of Match records, one per matching file.
+    """
+    return _matches(document_index, _lookup(document_index, cell_index, mode))
+
+
+def _matches(document_index, found):
+    # Only matched files are read back from the listing; their names were parsed once, by Listing.keys
+    listing = document_index.listing
+    matches = []
+    for key in document_index.first:
+        if key not in found:
+            continue
+        row, column = found[key]
+        for position in document_index.positions(key):
+            name, file_id = listing.name(position), listing.id(position)
+            matches.append(Match(document_index.label(position, key), name, file_id, file_url(file_id),
+                                 row, column, f"{column}{row}"))
+    return matches
+
+
+def _find_exact(document_index, rows, id_column, phone_column, extractor):
+    keys = document_index.first
+    found = {}
+    for row_number, id_value, phone_value in rows:
+        for key in extractor.cell_keys(id_value):
+            key = compact_key(key)
+            if key in keys and key not in found:
+                found[key] = (row_number, id_column)
+        key = normalize_phone(phone_value)
+        if key:
+            key = compact_key(key)
+            if key in keys and key not in found:
+                found[key] = (row_number, phone_column)
+    return found
+
+
+def _find_partial(document_index, rows, id_column, phone_column, extractor, mode):
+    return _lookup(document_index, index_cells(rows, id_column, phone_column, extractor, mode), mode)
+
+
+def _lookup(document_index, cell_index, mode):
+    found = {}
+    for key in document_index.first:
+        cell = cell_index.lookup(str(key), mode)
+        if cell is not None:
+            found[key] = cell
+    return found
@@ -0,0 +1,215 @@
+"""Timers and counters for API calls and pipeline stages, and the timing report built from them."""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from linker.cache import cache
+
+# Latency samples kept per operation for the percentiles
+MAX_SAMPLES = 10000
+
+# URL path segments naming an API resource; IDs and ranges in between are left out of operation names
+RESOURCES = {'files', 'changes', 'startPageToken', 'spreadsheets', 'values', 'batch'}
+
+
+def operation_name(method, uri):
+    """Name an API call after its API, HTTP method and resource, e.g. 'sheets POST values:batchUpdate'."""
+    parsed = urlparse(uri)
+    api = 'sheets' if parsed.netloc.startswith('sheets.') else 'drive'
+    resource = 'discovery' if 'discovery' in parsed.path else 'other'
+    for segment in parsed.path.split('/'):
+        if segment.partition(':')[0] in RESOURCES:
+            resource = segment
+    return f"{api} {method} {resource}"
+
+
+def percentile(samples, fraction):
+    """Return a percentile of a sorted list of samples (nearest rank)."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class Operation:
+    """Calls of one API operation or pipeline stage: count, latencies, bytes and errors."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors = 0
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {'count': self.count, 'seconds': self.seconds,
+                'mean': self.seconds / self.count if self.count else 0.0,
+                'p50': percentile(samples, 0.5), 'p95': percentile(samples, 0.95),
+                'p99': percentile(samples, 0.99), 'max': samples[-1] if samples else 0.0,
+                'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received, 'errors': self.errors}
+
+
+class Metrics:
+    """Thread-safe registry of API call and pipeline stage timings and event counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.calls = {}     # operation name -> Operation
+            self.stages = {}    # stage name -> Operation
+            self.waits = {}     # quota bucket and lane -> Operation of the time spent queued
+            self.counters = {}  # event name -> count
+            self.started = time.monotonic()
+
+    def record_call(self, name, seconds, bytes_sent=0, bytes_received=0, error=False):
+        """Record one API round-trip."""
+        self._record(self.calls, name, seconds, bytes_sent, bytes_received, error)
+
+    def record_stage(self, name, seconds, error=False):
+        """Record one run of a pipeline stage."""
+        self._record(self.stages, name, seconds, 0, 0, error)
+
+    def record_wait(self, name, seconds):
+        """Record the time one request waited for its quota (see linker.scheduler)."""
+        self._record(self.waits, name, seconds, 0, 0, False)
+
+    def _record(self, table, name, seconds, bytes_sent, bytes_received, error):
+        with self._lock:
+            operation = table.get(name)
+            if operation is None:
+                operation = table[name] = Operation()
+            operation.count += 1
+            operation.seconds += seconds
+            operation.samples.append(seconds)
+            operation.bytes_sent += bytes_sent
+            operation.bytes_received += bytes_received
+            operation.errors += bool(error)
+
+    def count(self, name, amount=1):
+        """Count an event such as a retry."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as a pipeline stage."""
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.record_stage(name, time.perf_counter() - start, failed)
+
+    def timed_iter(self, name, iterable):
+        """Wrap an iterable, recording the time spent producing its items as one stage run once exhausted."""
+        return TimedIterator(self, name, iterable)
+
+    def report(self):
+        """Return the recorded timings, counters and cache hit rates as a JSON-serializable dict."""
+        with self._lock:
+            report = {'elapsed': time.monotonic() - self.started,
+                      'calls': {name: operation.summary() for name, operation in sorted(self.calls.items())},
+                      'stages': {name: operation.summary() for name, operation in self.stages.items()},
+                      'queues': {name: operation.summary() for name, operation in sorted(self.waits.items())},
+                      'counters': dict(self.counters)}
+        report['cache'] = {}
+        for namespace, counters in cache.stats().items():
+            lookups = counters['hits'] + counters['misses']
+            report['cache'][namespace] = dict(counters, hit_rate=counters['hits'] / lookups if lookups else 0.0)
+        return report
+
+
+class TimedIterator:
+    """Iterator adding up the time another iterable takes to produce its items (in seconds)."""
+
+    def __init__(self, registry, name, iterable):
+        self.metrics = registry
+        self.name = name
+        self.seconds = 0.0
+        self._iterator = iter(iterable)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        except StopIteration:
+            self.seconds += time.perf_counter() - start
+            self.metrics.record_stage(self.name, self.seconds)
+            raise
+        self.seconds += time.perf_counter() - start
+        return item
+
+
+class InstrumentedHttp:
+    """Wraps an httplib2-style HTTP object, recording every request in a Metrics registry.
+
+    Round-trips retried by googleapiclient itself and batch requests are recorded as separate calls.
+    """
+
+    def __init__(self, http, registry=None):
+        self.http = http
+        self.metrics = registry or metrics
+
+    def request(self, uri, method='GET', body=None, *args, **kwargs):
+        start = time.perf_counter()
+        response, content = None, b''
+        try:
+            response, content = self.http.request(uri, method, body, *args, **kwargs)
+            return response, content
+        finally:
+            status = getattr(response, 'status', None)
+            self.metrics.record_call(operation_name(method, uri), time.perf_counter() - start,
+                                     len(body or b''), len(content or b''), status is None or status >= 400)
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+@contextmanager
+def profile(path):
+    """Profile the enclosed block of the calling thread with cProfile and save the stats to path."""
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def format_report(report):
+    """Format a timing report as a plain-text table."""
+    lines = [f"Elapsed: {report['elapsed']:.2f}s"]
+    for title, table in (('API calls', report['calls']), ('Stages', report['stages']),
+                         ('Queue wait', report['queues'])):
+        if not table:
+            continue
+        lines.append('')
+        lines.append(f"{title:<34}{'count':>7}{'total s':>10}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'KB':>9}{'errors':>7}")
+        for name, row in table.items():
+            kilobytes = (row['bytes_sent'] + row['bytes_received']) / 1024
+            lines.append(f"{name:<34}{row['count']:>7}{row['seconds']:>10.2f}{row['p50'] * 1000:>9.1f}"
+                         f"{row['p95'] * 1000:>9.1f}{row['max'] * 1000:>9.1f}{kilobytes:>9.0f}{row['errors']:>7}")
+    if report['counters']:
+        lines.append('')
+        lines.extend(f"{name}: {value}" for name, value in sorted(report['counters'].items()))
+    if report['cache']:
+        lines.append('')
+        lines.extend(f"Cache {namespace}: {row['hit_rate']:.0%} hits ({row['hits']}/{row['hits'] + row['misses']}), "
+                     f"{row['entries']} entries" for namespace, row in sorted(report['cache'].items()))
+    return '\n'.join(lines)
+
+
+# Metrics shared by the API clients, the pipeline and the GUI
+metrics = Metrics()
@@ -0,0 +1,146 @@
+"""Search-and-link jobs shared by the GUI and the headless command line."""
+import json
+import time
+from linker.drive import FILTERS, list_files
+from linker.keys import KeyExtractor
+from linker.matching import build_document_index, match_rows
+from linker.metrics import metrics
+from linker.scheduler import lane
+from linker.sheets import get_non_empty_columns, link_matches, parse_sheet_id, read_rows, relink_matches
+
+# Targets of a fan-out matched and linked at the same time
+MAX_WORKERS = 4
+
+
+def index_folder(drive, folder_id, extractor=None, progress=None, filters=None):
+    """List a Drive folder and index its documents by document key (see build_document_index).
+
+    filters narrow the listing down on the server (see linker.drive.files_query).
+    """
+    with metrics.stage('list_files'):
+        files = list_files(drive, folder_id, progress=progress, filters=filters)
+    with metrics.stage('index'):
+        return build_document_index(files, extractor)
+
+
+def match_sheet(sheets, document_index, sheet_id, tab_name, id_column, phone_column, extractor=None,
+                match_mode='exact', progress=None):
+    """Match an indexed folder against the ID and phone columns of a sheet tab.
+
+    extractor must be the one the index was built with; match_mode is one of linker.lookup.MATCH_MODES.
+    progress, if given, is called with a status message after each step.
+    """
+    # The sheet is streamed in row windows straight into the matcher; the time spent reading is
+    # recorded as read_rows and the rest as match
+    reads = metrics.timed_iter('read_rows', read_rows(sheets, sheet_id, tab_name, [id_column, phone_column],
+                                                     progress=progress))
+    rows = ((row_number, id_value, phone_value) for row_number, (id_value, phone_value) in reads)
+    start = time.perf_counter()
+    matches = match_rows(document_index, rows, id_column, phone_column, extractor, match_mode)
+    metrics.record_stage('match', time.perf_counter() - start - reads.seconds)
+    if progress:
+        progress(f"Matched {len(matches)} documents")
+    return matches
+
+
+def search_matches(drive, sheets, folder_id, sheet_id, tab_name, id_column, phone_column, extractor=None,
+                   match_mode='exact', progress=None):
+    """Match the documents of a Drive folder against the ID and phone columns of a sheet tab.
+
+    extractor is the linker.keys.KeyExtractor parsing document numbers out of file names and
+    match_mode one of linker.lookup.MATCH_MODES.
+    progress, if given, is called with a status message after each step.
+    """
+    document_index = index_folder(drive, folder_id, extractor, progress)
+    return match_sheet(sheets, document_index, sheet_id, tab_name, id_column, phone_column, extractor,
+                       match_mode, progress)
+
+
+def run_job(drive, sheets, job, document_index=None):
+    """Run one search (and optionally link) job described by a dict.
+
+    A job has the keys folder, sheet, tab, id_col, phone_col and optionally link_col,
+    key_patterns (rules for linker.keys.KeyExtractor.from_specs) and match_mode
+    ('exact', 'prefix' or 'contains'), and the listing filters name_contains, mime_types and
+    modified_after (see linker.drive.files_query). With relink the link column may hold links of an earlier
+    run and only the cells that changed are written (linker.sheets.relink_matches), clearing
+    stale links with clear_stale; dry_run plans the changes without writing them.
+    document_index, if given, is the folder already indexed with the job's key patterns.
+    Returns a result dict with the job, its matches, the number of linked rows, the write
+    statistics and any error.
+    """
+    result = {'job': job, 'matches': [], 'linked': 0, 'write': None, 'error': None}
+    sheet_id = parse_sheet_id(job['sheet'])
+    if not sheet_id:
+        result['error'] = "Invalid Google Sheet link."
+        return result
+
+    extractor = KeyExtractor.from_specs(job.get('key_patterns'))
+    if document_index is None:
+        document_index = index_folder(drive, job['folder'], extractor, filters=job_filters(job))
+    matches = match_sheet(sheets, document_index, sheet_id, job['tab'], job['id_col'], job['phone_col'],
+                          extractor, job.get('match_mode') or 'exact')
+    result['matches'] = matches
+
+    link_column = job.get('link_col')
+    if link_column and (job.get('relink') or job.get('dry_run')):
+        result['write'] = relink_matches(sheets, sheet_id, job['tab'], matches, [link_column.upper()],
+                                         bool(job.get('clear_stale')), bool(job.get('dry_run')))
+        if not job.get('dry_run'):
+            result['linked'] = result['write']['added'] + result['write']['changed']
+    elif link_column and matches:
+        link_column = link_column.upper()
+        if link_column in get_non_empty_columns(sheets, sheet_id, job['tab']):
+            result['error'] = f"Column {link_column} is not empty. Please select an empty column."
+            return result
+        result['write'] = link_matches(sheets, sheet_id, job['tab'], matches, [link_column])
+        result['linked'] = len(matches)
+    return result
+
+
+def job_filters(job):
+    """Return the listing filters of a job (see linker.drive.files_query), or None."""
+    return {name: job[name] for name in FILTERS if job.get(name)} or None
+
+
+def _index_key(job):
+    return job['folder'], json.dumps([job.get('key_patterns'), job_filters(job)], sort_keys=True)
+
+
+def run_fan_out(registry, jobs, max_workers=MAX_WORKERS, on_result=None):
+    """Run jobs matching Drive folders against many sheets and tabs in one pass.
+
+    Each folder is listed and indexed once per set of key patterns and filters, then every target is matched
+    and linked concurrently on up to max_workers threads of registry's fan-out pool, each with its
+    own API clients from registry (a linker.services.ServiceRegistry), all in the bulk lane of linker.scheduler. A job
+    that fails, or whose folder cannot be listed, gets its error in its result without stopping
+    the others. on_result(result), if
+    given, is called from the worker threads as each job finishes. Returns the results in the
+    order of jobs.
+    """
+    drive = registry.drive()
+    indexes, errors = {}, {}
+    with lane('bulk'):
+        for job in jobs:
+            key = _index_key(job)
+            if key in indexes or key in errors:
+                continue
+            try:
+                extractor = KeyExtractor.from_specs(job.get('key_patterns'))
+                indexes[key] = index_folder(drive, job['folder'], extractor, filters=job_filters(job))
+            except Exception as error:
+                errors[key] = f"Listing folder {job['folder']} failed: {error}"
+
+    def run(job):
+        try:
+            if _index_key(job) in errors:
+                raise RuntimeError(errors[_index_key(job)])
+            with lane('bulk'):
+                result = run_job(registry.drive(), registry.sheets(), job, indexes[_index_key(job)])
+        except Exception as error:
+            result = {'job': job, 'matches': [], 'linked': 0, 'write': None, 'error': str(error)}
+        if on_result:
+            on_result(result)
+        return result
+
+    return list(registry.pool('fan-out', max_workers).map(run, jobs))
@@ -0,0 +1,90 @@
+"""Search results held outside the GUI widgets, with link status, sorting and filtering."""
+
+COLUMNS = ('Check', 'Index', 'File Name', 'G-S Name', 'URL')
+
+# Marks shown in the Check column for each link status
+STATUS_MARKS = {None: "", 'linked': "✔️", 'failed': "❌", 'conflict': "⚠️"}
+
+# Sort keys of the columns, applied to (match, status)
+SORT_KEYS = {
+    'Check': lambda match, status: status or '',
+    'Index': lambda match, status: (len(match.index.lstrip('0')), match.index.lstrip('0')),
+    'File Name': lambda match, status: match.file_name.lower(),
+    'G-S Name': lambda match, status: (match.column, match.row),
+    'URL': lambda match, status: match.url,
+}
+
+
+class ResultsModel:
+    """The matches of the last search and their link status.
+
+    Views read rows through len() and row(); sorting and filtering only reorder an index list,
+    so they never touch a widget.
+    """
+
+    def __init__(self):
+        self.matches = []
+        self.status = {}     # file ID -> 'linked', 'failed' or 'conflict'
+        self.visible = []    # indices into matches, in display order
+        self.sort_column = None
+        self.sort_reverse = False
+        self.filter_text = ''
+
+    def set_matches(self, matches):
+        """Replace the results, clearing their status."""
+        self.matches = list(matches)
+        self.status = {}
+        self._update()
+
+    def set_status(self, matches, status):
+        """Set the link status of many matches at once."""
+        for match in matches:
+            self.status[match.file_id] = status
+        if self.sort_column == 'Check':
+            self._update()
+
+    def sort(self, column, reverse=None):
+        """Sort the visible rows by a column; sorting again by the same column reverses the order."""
+        if reverse is None:
+            reverse = not self.sort_reverse if column == self.sort_column else False
+        self.sort_column = column
+        self.sort_reverse = reverse
+        self._update()
+
+    def filter(self, text):
+        """Show only the rows whose index, file name, G-S name or URL contains text (case-insensitive)."""
+        self.filter_text = text.strip().lower()
+        self._update()
+
+    def _update(self):
+        indices = range(len(self.matches))
+        if self.filter_text:
+            text = self.filter_text
+            indices = [idx for idx in indices
+                       if any(text in value.lower() for value in self._searchable(self.matches[idx]))]
+        indices = list(indices)
+        if self.sort_column:
+            key = SORT_KEYS[self.sort_column]
+            indices.sort(key=lambda idx: key(self.matches[idx], self.status.get(self.matches[idx].file_id)),
+                         reverse=self.sort_reverse)
+        self.visible = indices
+
+    @staticmethod
+    def _searchable(match):
+        return match.index, match.file_name, match.gs_name, match.url
+
+    def __len__(self):
+        return len(self.visible)
+
+    def match(self, position):
+        """Return the match shown at a position of the view."""
+        return self.matches[self.visible[position]]
+
+    def row_status(self, position):
+        """Return the link status of the match shown at a position."""
+        return self.status.get(self.match(position).file_id)
+
+    def row(self, position):
+        """Return the column values shown at a position."""
+        match = self.match(position)
+        return (STATUS_MARKS[self.status.get(match.file_id)], match.index, match.file_name, match.gs_name, match.url)
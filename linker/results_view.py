@@ -0,0 +1,81 @@
+"""Virtualized Treeview showing a ResultsModel."""
+import tkinter as tk
+from tkinter import ttk
+from linker.results import COLUMNS
+
+# Tags of the link statuses
+STATUS_TAGS = {'linked': ("GREEN_BUTTON",), 'failed': ("RED_BUTTON",), 'conflict': ("YELLOW_BUTTON",)}
+
+COLUMN_WIDTHS = {'Check': 50, 'Index': 50, 'File Name': 200, 'G-S Name': 200, 'URL': 300}
+
+
+class ResultsView(ttk.Frame):
+    """Treeview with a fixed set of rows showing a window of the model.
+
+    Only the visible rows exist as Treeview items; scrolling moves the window over the model
+    and rewrites those items, so the widget cost does not grow with the number of results.
+    """
+
+    def __init__(self, parent, model, height=20):
+        super().__init__(parent)
+        self.model = model
+        self.height = height
+        self.offset = 0
+
+        self.tree = ttk.Treeview(self, columns=COLUMNS, show='headings', height=height, selectmode="browse")
+        for column in COLUMNS:
+            self.tree.heading(column, text=column, command=lambda column=column: self.sort(column))
+            self.tree.column(column, width=COLUMN_WIDTHS[column], anchor='center')
+        self.tree.tag_configure("GREEN_BUTTON", background="green")
+        self.tree.tag_configure("RED_BUTTON", background="red")
+        self.tree.tag_configure("YELLOW_BUTTON", background="yellow")
+        self.items = [self.tree.insert("", tk.END, values=()) for _ in range(height)]
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1, 'units'))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-1, 'units'))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(1, 'units'))
+        self.refresh()
+
+    def refresh(self):
+        """Redraw the visible rows from the model."""
+        self.offset = max(0, min(self.offset, len(self.model) - self.height))
+        for idx, item in enumerate(self.items):
+            position = self.offset + idx
+            if position < len(self.model):
+                tags = STATUS_TAGS.get(self.model.row_status(position), ())
+                self.tree.item(item, values=self.model.row(position), tags=tags)
+            else:
+                self.tree.item(item, values=(), tags=())
+        total = max(len(self.model), 1)
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.height) / total))
+
+    def scroll(self, amount, what):
+        """Scroll by rows ('units') or screens ('pages')."""
+        self.offset += amount * (self.height if what == 'pages' else 3)
+        self.refresh()
+        return "break"
+
+    def on_scrollbar(self, action, amount, what=None):
+        if action == 'moveto':
+            self.offset = int(float(amount) * len(self.model))
+            self.refresh()
+        else:
+            self.scroll(int(amount), what)
+
+    def sort(self, column):
+        """Sort the model by a column and redraw."""
+        self.model.sort(column)
+        self.offset = 0
+        self.refresh()
+
+    def selected_match(self):
+        """Return the match of the selected row, or None."""
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        position = self.offset + self.items.index(selection[0])
+        return self.model.match(position) if position < len(self.model) else None
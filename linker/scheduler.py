@@ -0,0 +1,236 @@
+"""Quota-aware scheduling of every Drive and Sheets API request.
+
+Requests draw tokens from a bucket per quota (Drive reads, Sheets reads, Sheets writes) before
+they are sent. Requests waiting for a bucket are served by priority lane, so requests behind a
+user action in the GUI overtake crawls and batch jobs, and a 429 pauses its bucket for the
+Retry-After delay and halves its rate, which then recovers with every successful request.
+Requests failing with a rate limit or server error are retried by execute_with_retry.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from linker.metrics import metrics, operation_name
+
+# Requests per minute per user of the default Google quotas; 0 or None for no limit
+LIMITS = {'drive_read': 12000, 'sheets_read': 60, 'sheets_write': 60}
+
+# Priority lanes, most urgent first
+LANES = ('interactive', 'bulk')
+
+# After a 429 the rate is multiplied by BACKOFF_FACTOR, down to MIN_RATE of the quota, and the
+# bucket pauses for the Retry-After delay or DEFAULT_PAUSE seconds; each successful request then
+# gives back RECOVERY of the quota's rate
+BACKOFF_FACTOR = 0.5
+MIN_RATE = 0.1
+DEFAULT_PAUSE = 1.0
+RECOVERY = 0.05
+
+# Retries of a request failing with 429 or 5xx, and the first and largest backoff delays in seconds
+MAX_RETRIES = 6
+BASE_DELAY = 1.0
+MAX_DELAY = 64.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_local = threading.local()
+
+
+def current_lane():
+    """Return the priority lane of the calling thread ('interactive' unless set by lane())."""
+    return getattr(_local, 'lane', LANES[0])
+
+
+@contextmanager
+def lane(name):
+    """Send the requests of the enclosed block, in the calling thread, in a priority lane."""
+    if name not in LANES:
+        raise ValueError(f"Unknown lane '{name}', expected one of {', '.join(LANES)}")
+    previous = current_lane()
+    _local.lane = name
+    try:
+        yield
+    finally:
+        _local.lane = previous
+
+
+def bucket_name(operation):
+    """Return the quota bucket of an API operation named like linker.metrics.operation_name, or None.
+
+    Sheets HTTP batches only hold spreadsheets.get calls here and count as reads.
+    """
+    api, method, resource = operation.split(' ', 2)
+    if resource == 'discovery':
+        return None
+    if api == 'drive':
+        return 'drive_read'
+    if method == 'GET' or resource in ('batch', 'values:batchGet', 'values:batchGetByDataFilter'):
+        return 'sheets_read'
+    return 'sheets_write'
+
+
+def request_operation(request):
+    """Return the operation name of a prepared request (a googleapiclient HttpRequest or emulator Request)."""
+    name = getattr(request, 'name', None)
+    return name if name is not None else operation_name(request.method, request.uri)
+
+
+def retry_after(headers):
+    """Return the Retry-After delay in seconds of an HTTP response's headers, or None."""
+    try:
+        return float(headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket of one quota of per_minute requests, with priority lanes and adaptive rate.
+
+    The bucket holds up to a minute's worth of tokens and refills at the current rate. A request
+    of several calls (an HTTP batch) waits for as many tokens as fit in the bucket and may leave
+    it in debt. The first waiter of the most urgent lane is served first.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.full_rate = per_minute / 60
+        self.rate = self.full_rate
+        self.tokens = float(per_minute)
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+        self._waiting = []  # heap of (lane priority, arrival) tickets
+        self._arrivals = itertools.count()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, cost=1, priority=0):
+        """Block until the request may be sent. Returns the seconds it waited."""
+        start = time.monotonic()
+        ticket = (priority, next(self._arrivals))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiting[0] != ticket:
+                        self._condition.wait()
+                        continue
+                    self._refill(now)
+                    needed = min(cost, self.capacity)
+                    delay = max(self.paused_until - now, (needed - self.tokens) / self.rate)
+                    if delay <= 0:
+                        self.tokens -= cost
+                        break
+                    self._condition.wait(delay)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+        return time.monotonic() - start
+
+    def throttle(self, delay=None):
+        """Slow down after a 429: pause for delay seconds (DEFAULT_PAUSE if None) and cut the rate."""
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.full_rate * MIN_RATE, self.rate * BACKOFF_FACTOR)
+            self.paused_until = max(self.paused_until, now + (delay if delay is not None else DEFAULT_PAUSE))
+            self._condition.notify_all()
+
+    def recover(self):
+        """Give back part of the rate after a successful request."""
+        if self.rate < self.full_rate:
+            with self._condition:
+                self._refill(time.monotonic())
+                self.rate = min(self.full_rate, self.rate + self.full_rate * RECOVERY)
+
+
+class Scheduler:
+    """The token buckets shared by every API client of the process, one per quota in limits."""
+
+    def __init__(self, limits=LIMITS):
+        self.configure(limits)
+
+    def configure(self, limits):
+        """Replace the buckets with new limits (requests per minute by bucket name; 0 for none)."""
+        self.limits = dict(limits)
+        self.buckets = {name: TokenBucket(per_minute) for name, per_minute in self.limits.items() if per_minute}
+
+    def acquire(self, operation, cost=1):
+        """Wait until a request of operation (cost calls) may be sent in the calling thread's lane."""
+        bucket = self.buckets.get(bucket_name(operation))
+        if bucket is None:
+            return
+        name = current_lane()
+        waited = bucket.acquire(cost, LANES.index(name))
+        metrics.record_wait(f"{bucket_name(operation)} {name}", waited)
+
+    def release(self, operation, status, headers=None):
+        """Record the HTTP status of a sent request, slowing its bucket down on 429."""
+        bucket = self.buckets.get(bucket_name(operation))
+        if bucket is None:
+            return
+        if status == 429:
+            metrics.count('throttled')
+            bucket.throttle(retry_after(headers))
+        elif status is not None and status < 400:
+            bucket.recover()
+
+
+class ScheduledHttp:
+    """Wraps an httplib2-style HTTP object, sending every request through a Scheduler."""
+
+    def __init__(self, http, shared=None):
+        self.http = http
+        self.scheduler = shared or scheduler
+
+    def request(self, uri, method='GET', body=None, *args, **kwargs):
+        operation = operation_name(method, uri)
+        cost = 1
+        if operation.endswith(' batch') and body:
+            # A batch request is charged one token per call it carries
+            cost = max(1, body.count(b'Content-ID:' if isinstance(body, bytes) else 'Content-ID:'))
+        self.scheduler.acquire(operation, cost)
+        response = None
+        try:
+            response, content = self.http.request(uri, method, body, *args, **kwargs)
+            return response, content
+        finally:
+            self.scheduler.release(operation, getattr(response, 'status', None), response)
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+def is_retryable(error):
+    """Whether an HttpError is a rate limit or server error worth retrying."""
+    from googleapiclient.errors import HttpError
+    return isinstance(error, HttpError) and error.resp.status in RETRY_STATUSES
+
+
+def execute_with_retry(request, max_retries=MAX_RETRIES, on_retry=None):
+    """Execute an API request, retrying 429 and 5xx errors with exponential backoff and full jitter.
+
+    A Retry-After delay sent with the error is waited out in full.
+    """
+    from googleapiclient.errors import HttpError
+    for attempt in range(max_retries + 1):
+        try:
+            return request.execute()
+        except HttpError as error:
+            if attempt == max_retries or not is_retryable(error):
+                raise
+            delay = max(random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt)), retry_after(error.resp) or 0)
+            metrics.count('retries')
+            if on_retry:
+                on_retry(error, delay)
+            time.sleep(delay)
+
+
+# Scheduler shared by the API clients of the GUI, the command line and the emulator
+scheduler = Scheduler()
@@ -0,0 +1,167 @@
+"""Authentication and API service clients for Google Drive and Google Sheets."""
+import datetime
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from linker import PROJECT_DIR
+from linker.emulator import from_env as emulator_from_env
+from linker.metrics import InstrumentedHttp
+from linker.scheduler import ScheduledHttp
+
+# Define Google Drive API and Google Sheets API scopes
+SCOPES = ['https://www.googleapis.com/auth/drive.readonly', 'https://www.googleapis.com/auth/spreadsheets']
+
+# Refresh the access token this long before it expires
+REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+# Timeout in seconds of a single HTTP request
+HTTP_TIMEOUT = 120
+
+
+def authenticate(token_path='token.json', credentials_path=None):
+    """Authenticate with Google APIs."""
+    # The Google client libraries take a while to import, so they are only loaded once needed
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
+    creds = None
+    if os.path.exists(token_path):
+        creds = Credentials.from_authorized_user_file(token_path)
+    # If there are no (valid) credentials available, let the user log in.
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            credentials_path = credentials_path or os.path.join(PROJECT_DIR, 'credentials.json')
+            flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
+            creds = flow.run_local_server(port=0)
+        # Save the credentials for the next run
+        with open(token_path, 'w') as token:
+            token.write(creds.to_json())
+    return creds
+
+
+class DiscoveryCache:
+    """File cache of API discovery documents, used by build() when it fetches them over the network."""
+
+    def __init__(self, directory=os.path.join(PROJECT_DIR, '.discovery_cache'), max_age=24 * 3600):
+        self.directory = directory
+        self.max_age = max_age
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + '.json')
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path) as document:
+                return document.read()
+        except OSError:
+            return None
+
+    def set(self, url, content):
+        path = self._path(url)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + '.tmp', 'w') as document:
+                document.write(content)
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+
+class ServiceRegistry:
+    """Authenticates once and hands out API clients shared by every action.
+
+    googleapiclient services are not thread-safe, so each thread gets its own Drive and
+    Sheets clients, built once over a persistent, instrumented (see linker.metrics) HTTP
+    connection whose requests wait for their quota (see linker.scheduler). The credentials are
+    shared and refreshed shortly before they expire.
+    With an emulator (linker.emulator.Emulator), its in-process services are handed out
+    instead and no authentication takes place.
+
+    Concurrent work runs on the registry's long-lived thread pools (see pool()), so the clients
+    a worker thread builds serve every later crawl or fan-out instead of being thrown away.
+    """
+
+    def __init__(self, token_path='token.json', credentials_path=None, discovery_cache=None, emulator=None):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.discovery_cache = discovery_cache or DiscoveryCache()
+        self.emulator = emulator
+        self._creds = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pools = {}  # (name, max_workers) -> ThreadPoolExecutor
+
+    def credentials(self):
+        """Return valid credentials, authenticating on first use and refreshing before expiry."""
+        with self._lock:
+            if self._creds is None:
+                self._creds = authenticate(self.token_path, self.credentials_path)
+            elif self._expiring(self._creds) and self._creds.refresh_token:
+                from google.auth.transport.requests import Request
+                self._creds.refresh(Request())
+                with open(self.token_path, 'w') as token:
+                    token.write(self._creds.to_json())
+            return self._creds
+
+    @staticmethod
+    def _expiring(creds):
+        # Credentials.expiry is a naive UTC datetime
+        if not creds.valid:
+            return True
+        return creds.expiry is not None and creds.expiry - datetime.datetime.utcnow() < REFRESH_MARGIN
+
+    def service(self, name, version):
+        """Return this thread's client for an API, building it on first use."""
+        services = self._local.__dict__.setdefault('services', {})
+        key = (name, version)
+        if self.emulator is not None:
+            if key not in services:
+                services[key] = self.emulator.service(name, version)
+            return services[key]
+        creds = self.credentials()
+        if key not in services:
+            import google_auth_httplib2
+            import httplib2
+            from googleapiclient.discovery import build
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            http = ScheduledHttp(InstrumentedHttp(http))
+            services[key] = build(name, version, http=http, cache=self.discovery_cache)
+        return services[key]
+
+    def pool(self, name, max_workers):
+        """Return the thread pool of max_workers threads named name, created on first use and kept."""
+        with self._lock:
+            key = (name, max_workers)
+            if key not in self._pools:
+                self._pools[key] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+            return self._pools[key]
+
+    def drive(self):
+        """Return this thread's Google Drive API client."""
+        return self.service('drive', 'v3')
+
+    def sheets(self):
+        """Return this thread's Google Sheets API client."""
+        return self.service('sheets', 'v4')
+
+
+# Registry shared by the GUI, served by the emulator when LINKER_EMULATOR is set
+registry = ServiceRegistry(emulator=emulator_from_env())
+
+
+def drive_service():
+    """Return the shared Google Drive API client of this thread."""
+    return registry.drive()
+
+
+def sheets_service():
+    """Return the shared Google Sheets API client of this thread."""
+    return registry.sheets()
@@ -0,0 +1,247 @@
+"""Google Sheets reads and URL writes."""
+import re
+from linker.a1 import column_to_letter, quote_tab
+from linker.batch import execute_batch
+from linker.cache import cache
+from linker.matching import is_file_url
+from linker.metrics import metrics
+from linker.scheduler import execute_with_retry
+from linker.writer import coalesce_ranges, write_ranges
+
+SHEET_LINK = re.compile(r'/spreadsheets/d/([a-zA-Z0-9-_]+)')
+SHEET_ID = re.compile(r'^[a-zA-Z0-9-_]+$')
+
+# Rows fetched per batchGet by read_rows
+CHUNK_ROWS = 10000
+
+# Field mask of the spreadsheets.get behind sheet_metadata
+METADATA_FIELDS = "properties.title,sheets.properties(title,gridProperties(rowCount,columnCount))"
+
+# Cell counts of a re-link plan (see diff_links)
+PLAN_COUNTS = ['added', 'changed', 'unchanged', 'stale', 'conflicts']
+
+
+def parse_sheet_id(sheet_link):
+    """Extract the spreadsheet ID from a Google Sheet link (a bare ID is returned as is)."""
+    match = SHEET_LINK.search(sheet_link)
+    if match:
+        return match.group(1)
+    if SHEET_ID.match(sheet_link):
+        return sheet_link
+    return None
+
+
+def _snapshot(response):
+    return {'title': response.get('properties', {}).get('title'),
+            'tabs': {tab['properties']['title']: tab['properties'].get('gridProperties', {})
+                     for tab in response.get('sheets', [])},
+            'headers': None}
+
+
+def sheet_metadata(service, sheet_id, headers=False):
+    """Return the cached metadata snapshot of a spreadsheet.
+
+    The snapshot is a dict with the spreadsheet title, its tabs in order (title -> grid
+    properties with rowCount and columnCount) and, once requested with headers, the header
+    row of every tab (title -> values). It takes one field-masked spreadsheets.get and one
+    batchGet for all the header rows, and is dropped when the linker writes to the sheet.
+    """
+    snapshot = cache.get('metadata', sheet_id)
+    if snapshot is None:
+        response = execute_with_retry(service.spreadsheets().get(spreadsheetId=sheet_id, fields=METADATA_FIELDS))
+        snapshot = _snapshot(response)
+        cache.set('metadata', sheet_id, snapshot)
+    if headers and snapshot['headers'] is None:
+        titles = list(snapshot['tabs'])
+        result = execute_with_retry(service.spreadsheets().values().batchGet(
+            spreadsheetId=sheet_id, ranges=[f"{quote_tab(title)}!1:1" for title in titles], fields="valueRanges(values)"))
+        header_rows = [(value_range.get('values') or [[]])[0] for value_range in result.get('valueRanges', [])]
+        snapshot = dict(snapshot, headers=dict(zip(titles, header_rows)))
+        cache.set('metadata', sheet_id, snapshot)
+    return snapshot
+
+
+def get_row_count(service, sheet_id, tab_name):
+    """Return the number of grid rows of a tab."""
+    tab = sheet_metadata(service, sheet_id)['tabs'].get(tab_name)
+    if tab is None:
+        raise ValueError(f"Tab '{tab_name}' not found in the Google Sheet.")
+    return tab['rowCount']
+
+
+def read_rows(service, sheet_id, tab_name, columns, chunk_rows=CHUNK_ROWS, progress=None):
+    """Stream the values of some columns of a tab as (row_number, [value per column]).
+
+    The tab is read in windows of chunk_rows rows, each with a single batchGet for all the
+    columns, so only one window is held in memory. Blank rows are skipped and blank cells
+    are returned as ''. progress, if given, is called with a status message after each window.
+    """
+    row_count = get_row_count(service, sheet_id, tab_name)
+    for start in range(1, row_count + 1, chunk_rows):
+        end = min(start + chunk_rows - 1, row_count)
+        ranges = [f"{quote_tab(tab_name)}!{column}{start}:{column}{end}" for column in columns]
+        result = execute_with_retry(service.spreadsheets().values().batchGet(spreadsheetId=sheet_id, ranges=ranges,
+                                                                             majorDimension='COLUMNS',
+                                                                             fields="valueRanges(values)"))
+        column_values = [(value_range.get('values') or [[]])[0] for value_range in result.get('valueRanges', [])]
+        for offset in range(end - start + 1):
+            row = [values[offset] if offset < len(values) else '' for values in column_values]
+            if any(row):
+                yield start + offset, row
+        if progress:
+            progress(f"Read {end} of {row_count} sheet rows")
+
+
+def list_tabs(service, sheet_id):
+    """List tabs of a Google Sheet."""
+    return list(sheet_metadata(service, sheet_id)['tabs'])
+
+
+def list_tabs_many(service, sheet_ids):
+    """List the tabs of several Google Sheets with one HTTP batch request per BATCH_SIZE sheets.
+
+    The metadata snapshots are cached like those of sheet_metadata.
+    Returns (tabs, errors): dicts of sheet ID -> tab names and sheet ID -> HttpError.
+    """
+    tabs, requests = {}, {}
+    for sheet_id in dict.fromkeys(sheet_ids):
+        snapshot = cache.get('metadata', sheet_id)
+        if snapshot is not None:
+            tabs[sheet_id] = list(snapshot['tabs'])
+        else:
+            requests[sheet_id] = service.spreadsheets().get(spreadsheetId=sheet_id, fields=METADATA_FIELDS)
+    responses, errors = execute_batch(service, requests)
+    for sheet_id, response in responses.items():
+        snapshot = _snapshot(response)
+        cache.set('metadata', sheet_id, snapshot)
+        tabs[sheet_id] = list(snapshot['tabs'])
+    return tabs, errors
+
+
+def list_columns(service, sheet_id, tab_name):
+    """List columns of a Google Sheets tab as (name, letter) tuples, or [] if the tab does not exist."""
+    header = sheet_metadata(service, sheet_id, headers=True)['headers'].get(tab_name)
+    if header is None:
+        return []
+    return [(col_name, column_to_letter(idx + 1)) for idx, col_name in enumerate(header)]
+
+
+def get_non_empty_columns(service, sheet_id, tab_name):
+    """Retrieve non-empty columns in the specified Google Sheet tab (those with a header)."""
+    header = sheet_metadata(service, sheet_id, headers=True)['headers'].get(tab_name, [])
+    return [column_to_letter(col_idx) for col_idx, cell in enumerate(header, start=1) if cell]
+
+
+def _write_cells(service, sheet_id, tab_name, cells, progress=None):
+    data = coalesce_ranges(tab_name, cells)
+    if not data:
+        return {'cells': 0, 'requests': 0, 'retries': 0, 'skipped_chunks': 0, 'seconds': 0.0, 'cells_per_second': 0.0}
+
+    with metrics.stage('write'):
+        stats = write_ranges(service, sheet_id, data, progress=progress)
+    # The written sheet no longer matches its cached metadata
+    cache.invalidate('metadata', lambda key: key == sheet_id)
+    return stats
+
+
+def link_matches(service, sheet_id, tab_name, matches, columns_to_fill, progress=None):
+    """Paste the URLs of matched documents into the specified columns of their rows.
+
+    Nearby rows and adjacent columns are written as one range (unmatched rows in between are
+    sent as nulls and left untouched), in size-bounded chunks that are retried on
+    rate limit and server errors and journaled so an interrupted link resumes where it stopped.
+    progress, if given, is called with a status message after each chunk.
+    Returns the write statistics of linker.writer.write_ranges.
+    """
+    cells = [(match.row, col, match.url) for match in matches for col in columns_to_fill]
+    return _write_cells(service, sheet_id, tab_name, cells, progress)
+
+
+def diff_links(service, sheet_id, tab_name, matches, columns_to_fill, progress=None):
+    """Compare the URLs of matched documents with what the link columns already hold.
+
+    The link columns are read once. A cell that is empty gets added and one holding another
+    Drive URL gets changed; a cell already holding the right URL is left alone, and one holding
+    anything but a Drive URL is a conflict and never overwritten. Drive URLs in rows without a
+    match are stale (their document is gone or no longer matches).
+    Returns a plan dict with the cells to write ('cells') and the stale cells to clear ('clear'),
+    as (row, column, value) lists, the count of each kind of cell (PLAN_COUNTS) and the matches
+    by outcome ('outcomes': lists of the matches with a cell to write, with every cell already
+    right and with a conflicting cell, under 'written', 'unchanged' and 'conflicts'). A match
+    sharing its row with a later match of the same row is in none of them.
+    """
+    columns_to_fill = [column.upper() for column in columns_to_fill]
+    expected = {(match.row, column): match.url for match in matches for column in columns_to_fill}
+    current = {}
+    with metrics.stage('diff'):
+        for row_number, row in read_rows(service, sheet_id, tab_name, columns_to_fill, progress=progress):
+            for column, value in zip(columns_to_fill, row):
+                if value:
+                    current[row_number, column] = value
+
+        plan = dict.fromkeys(PLAN_COUNTS, 0)
+        plan['cells'] = []
+        kinds = {}  # (row, column) -> kind of cell
+        for (row, column), url in sorted(expected.items()):
+            value = current.get((row, column))
+            if value == url:
+                kind = 'unchanged'
+            elif value and not is_file_url(value):
+                kind = 'conflicts'
+            else:
+                kind = 'changed' if value else 'added'
+                plan['cells'].append((row, column, url))
+            plan[kind] += 1
+            kinds[row, column] = kind
+
+        plan['outcomes'] = {'written': [], 'unchanged': [], 'conflicts': []}
+        for match in matches:
+            cells = {kinds[match.row, column] for column in columns_to_fill
+                     if expected[match.row, column] == match.url}
+            if 'conflicts' in cells:
+                plan['outcomes']['conflicts'].append(match)
+            elif cells - {'unchanged'}:
+                plan['outcomes']['written'].append(match)
+            elif cells:
+                plan['outcomes']['unchanged'].append(match)
+        plan['clear'] = [(row, column, '') for (row, column), value in sorted(current.items())
+                         if (row, column) not in expected and is_file_url(value)]
+        plan['stale'] = len(plan['clear'])
+    return plan
+
+
+def format_plan(plan):
+    """Summarize the cell counts of a re-link plan, e.g. '3 added, 1 changed, 120 unchanged, ...'."""
+    return ', '.join(f"{plan[count]} {count}" for count in PLAN_COUNTS)
+
+
+def write_plan(service, sheet_id, tab_name, plan, clear_stale=False, progress=None):
+    """Write the cells of a re-link plan (see diff_links), and clear its stale links with clear_stale.
+
+    Returns the counts of the plan with the number of cleared cells and the write statistics of
+    linker.writer.write_ranges.
+    """
+    cells = plan['cells'] + (plan['clear'] if clear_stale else [])
+    stats = {count: plan[count] for count in PLAN_COUNTS}
+    stats['cleared'] = len(plan['clear']) if clear_stale else 0
+    stats['dry_run'] = False
+    stats.update(_write_cells(service, sheet_id, tab_name, cells, progress))
+    return stats
+
+
+def relink_matches(service, sheet_id, tab_name, matches, columns_to_fill, clear_stale=False, dry_run=False,
+                   progress=None):
+    """Bring the link columns up to date, writing only the cells that differ (see diff_links).
+
+    Unlike link_matches the columns may already hold links from an earlier run, so running it
+    again on unchanged data writes nothing. With clear_stale the stale links are cleared too, and
+    with dry_run nothing is written at all.
+    Returns the statistics of write_plan, or with dry_run only the counts of the plan.
+    """
+    plan = diff_links(service, sheet_id, tab_name, matches, columns_to_fill, progress)
+    if not dry_run:
+        return write_plan(service, sheet_id, tab_name, plan, clear_stale, progress)
+    stats = {count: plan[count] for count in PLAN_COUNTS}
+    stats['cleared'] = 0
+    stats['dry_run'] = True
+    return stats
@@ -0,0 +1,142 @@
+"""Persistent SQLite cache of Drive folder listings, kept current with the Drive Changes API."""
+import os
+import sqlite3
+import threading
+import time
+from linker import PROJECT_DIR
+from linker.listing import Listing
+from linker.scheduler import execute_with_retry
+
+DEFAULT_PATH = os.path.join(PROJECT_DIR, 'linker_cache.sqlite')
+
+# Minimum number of seconds between two changes.list syncs
+SYNC_INTERVAL = 30
+
+CHANGE_FIELDS = ("nextPageToken, newStartPageToken, "
+                 "changes(fileId, removed, file(id, name, mimeType, parents, trashed))")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (folder_id TEXT PRIMARY KEY, listed_at REAL);
+CREATE TABLE IF NOT EXISTS files (
+    folder_id TEXT,
+    file_id TEXT,
+    name TEXT,
+    mime_type TEXT,
+    PRIMARY KEY (folder_id, file_id)
+);
+CREATE INDEX IF NOT EXISTS files_by_id ON files (file_id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class ListingStore:
+    """Folder listings keyed by folder ID, stored on disk across sessions.
+
+    A start page token of the Drive Changes API is kept with the listings; sync() fetches only
+    the files added, renamed, moved or trashed since the last sync and applies them to the
+    cached folders.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _get_meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_listing(self, folder_id):
+        """Return the cached files of a folder as a Listing, or None if the folder was never listed."""
+        with self._lock:
+            if not self._db.execute("SELECT 1 FROM folders WHERE folder_id = ?", (folder_id,)).fetchone():
+                return None
+            rows = self._db.execute("SELECT file_id, name, mime_type FROM files WHERE folder_id = ? ORDER BY rowid",
+                                    (folder_id,))
+            return Listing.from_rows(rows)
+
+    def save_listing(self, folder_id, files):
+        """Replace the cached files of a folder with a fresh Listing."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM files WHERE folder_id = ?", (folder_id,))
+            self._db.executemany("INSERT OR REPLACE INTO files (folder_id, file_id, name, mime_type) VALUES (?, ?, ?, ?)",
+                                 ((folder_id,) + row for row in files.rows()))
+            self._db.execute("INSERT OR REPLACE INTO folders (folder_id, listed_at) VALUES (?, ?)",
+                             (folder_id, time.time()))
+
+    def forget(self, folder_id=None):
+        """Drop one cached folder, or all of them."""
+        with self._lock, self._db:
+            if folder_id is None:
+                self._db.execute("DELETE FROM files")
+                self._db.execute("DELETE FROM folders")
+            else:
+                self._db.execute("DELETE FROM files WHERE folder_id = ?", (folder_id,))
+                self._db.execute("DELETE FROM folders WHERE folder_id = ?", (folder_id,))
+
+    def apply_changes(self, changes):
+        """Apply a page of changes.list results to the cached folders."""
+        with self._lock, self._db:
+            cached = {row[0] for row in self._db.execute("SELECT folder_id FROM folders")}
+            for change in changes:
+                file = change.get('file')
+                if change.get('removed') or not file or file.get('trashed'):
+                    self._db.execute("DELETE FROM files WHERE file_id = ?", (change['fileId'],))
+                    continue
+                parents = set(file.get('parents', []))
+                # Drop the file from folders it was moved out of, then add or rename it in the cached parents
+                for (folder_id,) in self._db.execute("SELECT folder_id FROM files WHERE file_id = ?",
+                                                     (file['id'],)).fetchall():
+                    if folder_id not in parents:
+                        self._db.execute("DELETE FROM files WHERE folder_id = ? AND file_id = ?", (folder_id, file['id']))
+                for folder_id in parents & cached:
+                    self._db.execute("INSERT OR REPLACE INTO files (folder_id, file_id, name, mime_type) VALUES (?, ?, ?, ?)",
+                                     (folder_id, file['id'], file['name'], file.get('mimeType')))
+
+    def sync(self, service, force=False):
+        """Fetch the Drive changes since the last sync and apply them.
+
+        The first call only records a start page token. Calls within SYNC_INTERVAL seconds of the
+        previous sync are skipped unless force is set. Returns the number of changes applied.
+        """
+        with self._sync_lock:
+            if not force and time.monotonic() - self._last_sync < SYNC_INTERVAL:
+                return 0
+            return self._sync(service)
+
+    def _sync(self, service):
+        with self._lock:
+            page_token = self._get_meta('start_page_token')
+        if page_token is None:
+            response = execute_with_retry(service.changes().getStartPageToken())
+            with self._lock, self._db:
+                # Listings cached without a token may have missed changes
+                self._db.execute("DELETE FROM files")
+                self._db.execute("DELETE FROM folders")
+                self._set_meta('start_page_token', response['startPageToken'])
+            self._last_sync = time.monotonic()
+            return 0
+
+        applied = 0
+        while page_token:
+            response = execute_with_retry(service.changes().list(pageToken=page_token, fields=CHANGE_FIELDS,
+                                                                 pageSize=1000, includeRemoved=True, spaces='drive'))
+            changes = response.get('changes', [])
+            self.apply_changes(changes)
+            applied += len(changes)
+            page_token = response.get('nextPageToken')
+            new_start = response.get('newStartPageToken')
+            with self._lock, self._db:
+                self._set_meta('start_page_token', page_token or new_start)
+        self._last_sync = time.monotonic()
+        return applied
@@ -0,0 +1,116 @@
+"""Run blocking Drive and Sheets calls on worker threads and report back on the Tk main loop."""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Cancelled(Exception):
+    """Raised inside a task once it has been cancelled."""
+
+
+class Task:
+    """Handle of a submitted task, passed to the task function for progress and cancellation."""
+
+    def __init__(self, runner, on_progress=None):
+        self._runner = runner
+        self._on_progress = on_progress
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Ask the task to stop at its next progress report."""
+        self._cancelled.set()
+
+    def check(self):
+        """Raise Cancelled if the task has been cancelled."""
+        if self.cancelled:
+            raise Cancelled()
+
+    def progress(self, message):
+        """Report progress to the main thread (raises Cancelled once the task is cancelled)."""
+        self.check()
+        if self._on_progress:
+            self._runner.post(self._on_progress, message)
+
+
+class TaskRunner:
+    """Thread pool whose callbacks are delivered on the Tk main thread.
+
+    Worker threads never touch widgets: results, errors and progress messages are queued
+    and dispatched from a queue polled with root.after.
+    """
+
+    def __init__(self, root, max_workers=4, poll_interval=50):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='linker')
+        self._queue = queue.Queue()
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, func, on_done=None, on_error=None, on_progress=None):
+        """Run func(task) on a worker thread and return the task handle.
+
+        on_done(result), on_error(exception) and on_progress(message) run on the main thread.
+        A cancelled task calls none of them.
+        """
+        task = Task(self, on_progress)
+        with self._lock:
+            self._tasks.add(task)
+
+        def run():
+            try:
+                # A task cancelled while queued never starts
+                task.check()
+                result = func(task)
+                task.check()
+            except Cancelled:
+                return
+            except Exception as error:
+                if on_error and not task.cancelled:
+                    self.post(on_error, error)
+            else:
+                if on_done:
+                    self.post(on_done, result)
+            finally:
+                with self._lock:
+                    self._tasks.discard(task)
+
+        self._executor.submit(run)
+        return task
+
+    @property
+    def busy(self):
+        """Whether any task is still running."""
+        with self._lock:
+            return bool(self._tasks)
+
+    def post(self, callback, *args):
+        """Queue a callback to run on the main thread."""
+        self._queue.put((callback, args))
+
+    def cancel_all(self):
+        """Cancel every running task."""
+        with self._lock:
+            tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+
+    def shutdown(self):
+        """Cancel running tasks and stop the worker threads."""
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        """Reschedule the poll, then dispatch queued callbacks."""
+        self.root.after(self.poll_interval, self._poll)
+        while True:
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
@@ -0,0 +1,209 @@
+"""Watch mode: link documents into their sheets as they land in Drive folders.
+
+Instead of listing the folders again, a Watcher polls the Drive Changes API for the files
+created, renamed or moved since its last poll and matches only those against indexes of the
+target sheets held in memory, so the cost of a poll depends on the number of changes rather
+than on the size of the folders.
+"""
+import threading
+import time
+from linker.drive import FOLDER_MIME_TYPE
+from linker.keys import KeyExtractor
+from linker.listing import Listing
+from linker.matching import build_document_index, index_cells, is_file_url, match_cells
+from linker.metrics import metrics
+from linker.pipeline import run_fan_out
+from linker.scheduler import execute_with_retry
+from linker.sheets import link_matches, parse_sheet_id, read_rows
+from linker.store import CHANGE_FIELDS
+
+# Seconds between two polls of the Changes API
+POLL_INTERVAL = 10
+
+# Seconds after which the sheet indexes are read again, to pick up rows added to the sheets
+SHEET_REFRESH = 300
+
+
+class WatchTarget:
+    """One sheet target of a watch job: the index of its ID and phone cells and its current links."""
+
+    def __init__(self, job):
+        self.job = job
+        self.sheet_id = parse_sheet_id(job['sheet'])
+        if not self.sheet_id:
+            raise ValueError(f"Invalid Google Sheet link: {job['sheet']}")
+        if not job.get('link_col'):
+            raise ValueError(f"Job {job} has no link_col to link new documents into")
+        self.link_column = job['link_col'].upper()
+        self.extractor = KeyExtractor.from_specs(job.get('key_patterns'))
+        self.match_mode = job.get('match_mode') or 'exact'
+        self.cells = None
+        self.links = {}  # row -> current value of the link cell
+        self.stale = True  # read the sheet again at the next poll
+        self.pending = {}  # file ID -> file resource not linked yet because of an error
+
+    def refresh(self, sheets, progress=None):
+        """Read the ID, phone and link columns of the sheet once and index them."""
+        rows, self.links = [], {}
+        columns = [self.job['id_col'], self.job['phone_col'], self.link_column]
+        with metrics.stage('read_rows'):
+            for row_number, (id_value, phone_value, link) in read_rows(sheets, self.sheet_id, self.job['tab'], columns,
+                                                                       progress=progress):
+                rows.append((row_number, id_value, phone_value))
+                if link:
+                    self.links[row_number] = link
+        self.cells = index_cells(rows, self.job['id_col'], self.job['phone_col'], self.extractor, self.match_mode)
+        self.stale = False
+
+    def link(self, sheets, files):
+        """Match new files (a Listing) against the sheet and link those whose cell lacks their URL.
+
+        Link cells holding anything but a Drive URL are left alone.
+        Returns the matches that were linked.
+        """
+        document_index = build_document_index(files, self.extractor)
+        matches = match_cells(document_index, self.cells, self.match_mode)
+        to_link = []
+        for match in matches:
+            current = self.links.get(match.row)
+            if current != match.url and (not current or is_file_url(current)):
+                to_link.append(match)
+        if to_link:
+            link_matches(sheets, self.sheet_id, self.job['tab'], to_link, [self.link_column])
+            for match in to_link:
+                self.links[match.row] = match.url
+        return to_link
+
+
+class Watcher:
+    """Links the documents arriving in the folders of some jobs into the jobs' sheets.
+
+    Jobs are dicts like those of linker.pipeline.run_job and must have a link_col. start()
+    takes a Changes API page token, brings the sheets up to date with one full re-link
+    (linker.sheets.relink_matches) unless catch_up is False, and indexes the sheets; each poll()
+    then fetches the changes since the previous one and links the new and renamed files of the
+    watched folders. registry is a linker.services.ServiceRegistry.
+
+    Failures never stop the watch: a target whose catch-up or sheet read fails gets an error
+    result and is read again at the next poll, and a poll whose changes cannot be fetched is
+    reported to on_error(error), if given, and retried from the same page token at the next one.
+    """
+
+    def __init__(self, registry, jobs, sheet_refresh=SHEET_REFRESH, on_result=None, on_error=None):
+        self.registry = registry
+        self.targets = [WatchTarget(job) for job in jobs]
+        self.sheet_refresh = sheet_refresh
+        self.on_result = on_result
+        self.on_error = on_error
+        self.page_token = None
+        self._refreshed = 0.0
+
+    def start(self, catch_up=True, progress=None):
+        """Take the Changes API page token, catch up with a full re-link and index the sheets.
+
+        Returns the results of the catch-up and of the sheet reads that failed.
+        """
+        drive = self.registry.drive()
+        # The token comes first so files arriving during the catch-up are seen by the first poll
+        self.page_token = execute_with_retry(drive.changes().getStartPageToken())['startPageToken']
+        results = []
+        if catch_up:
+            jobs = [dict(target.job, relink=True) for target in self.targets]
+            results = run_fan_out(self.registry, jobs, on_result=self.on_result)
+        return results + self.refresh(progress)
+
+    def _result(self, target, error=None):
+        result = {'job': target.job, 'matches': [], 'linked': 0, 'write': None, 'error': error}
+        if error is not None and self.on_result:
+            self.on_result(result)
+        return result
+
+    def refresh(self, progress=None, targets=None):
+        """Read the sheets of targets (all by default) again.
+
+        Returns an error result per target whose sheet could not be read.
+        """
+        sheets = self.registry.sheets()
+        failed = []
+        for target in self.targets if targets is None else targets:
+            try:
+                target.refresh(sheets, progress)
+            except Exception as error:
+                target.stale = True
+                failed.append(self._result(target, f"Reading the sheet failed: {error}"))
+        if targets is None:
+            self._refreshed = time.monotonic()
+        return failed
+
+    def changed_files(self):
+        """Fetch the changes since the last poll and return the new or changed files by watched folder.
+
+        Folders, trashed files and files outside the watched folders are left out.
+        Returns a dict of folder ID -> {file ID: file resource}.
+        """
+        drive = self.registry.drive()
+        folders = {target.job['folder'] for target in self.targets}
+        files = {}
+        page_token = self.page_token
+        while page_token:
+            response = execute_with_retry(drive.changes().list(pageToken=page_token, fields=CHANGE_FIELDS,
+                                                               pageSize=1000, spaces='drive'))
+            for change in response.get('changes', []):
+                file = change.get('file')
+                if change.get('removed') or not file or file.get('trashed') or file.get('mimeType') == FOLDER_MIME_TYPE:
+                    continue
+                for folder_id in folders.intersection(file.get('parents', [])):
+                    files.setdefault(folder_id, {})[file['id']] = file
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                self.page_token = response['newStartPageToken']
+        return files
+
+    def poll(self):
+        """Link the files added, renamed or moved into the watched folders since the last poll.
+
+        A target that fails gets its error in its result without stopping the others.
+        Returns a result dict (like those of linker.pipeline.run_job) per target with new files
+        or whose sheet could not be read.
+        """
+        if time.monotonic() - self._refreshed >= self.sheet_refresh:
+            results = self.refresh()
+        else:
+            results = self.refresh(targets=[target for target in self.targets if target.stale])
+        try:
+            with metrics.stage('poll'):
+                changed = self.changed_files()
+        except Exception as error:
+            # The page token only moves on once every page is in, so the next poll fetches these changes again
+            metrics.count('poll_errors')
+            if self.on_error:
+                self.on_error(error)
+            return results
+        sheets = self.registry.sheets()
+        for target in self.targets:
+            target.pending.update(changed.get(target.job['folder'], {}))
+            # A target never read keeps its files until its sheet can be read; one read before
+            # links with its previous index meanwhile
+            if not target.pending or target.cells is None:
+                continue
+            result = self._result(target)
+            try:
+                result['matches'] = target.link(sheets, Listing(target.pending.values()))
+                result['linked'] = len(result['matches'])
+                target.pending = {}
+            except Exception as error:
+                result['error'] = str(error)
+            if self.on_result:
+                self.on_result(result)
+            results.append(result)
+        return results
+
+    def run(self, interval=POLL_INTERVAL, stop=None, max_polls=None):
+        """Poll every interval seconds until stop (a threading.Event) is set or after max_polls polls."""
+        stop = stop or threading.Event()
+        polls = 0
+        while not stop.is_set() and (max_polls is None or polls < max_polls):
+            self.poll()
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                stop.wait(interval)
@@ -0,0 +1,202 @@
+"""Chunked, retrying and resumable writes of cell values into a Google Sheet."""
+import hashlib
+import json
+import os
+import time
+from linker import PROJECT_DIR
+from linker.a1 import block_range, column_to_letter, letter_to_column, split_cell, split_range
+from linker.scheduler import execute_with_retry
+
+JOURNAL_DIR = os.path.join(PROJECT_DIR, '.link_journal')
+
+# Rows of untouched cells bridged by nulls before a write is split into two ranges;
+# a null costs about 8 bytes of JSON, a separate range about 50
+MAX_GAP = 6
+
+# Bounds of a single batchUpdate request
+CHUNK_CELLS = 5000
+CHUNK_BYTES = 1024 * 1024
+
+
+def coalesce_ranges(tab_name, cells, max_gap=MAX_GAP):
+    """Merge (row, column, value) cells into as few ranges as possible.
+
+    Adjacent columns are written as one block, and rows at most max_gap rows apart are merged
+    into one range with null values in between, which the Sheets API skips, leaving those cells
+    untouched. With max_gap=None every run of adjacent columns becomes a single dense range
+    over its whole row span. A later cell for the same row and column replaces an earlier one.
+    """
+    grid = {}
+    for row, column, value in cells:
+        grid.setdefault(letter_to_column(column), {})[row] = value
+
+    data = []
+    for first, last in _column_runs(sorted(grid)):
+        columns = range(first, last + 1)
+        rows = sorted(set().union(*(grid[column] for column in columns)))
+        start = previous = rows[0]
+        for row in rows[1:] + [None]:
+            if row is not None and (max_gap is None or row - previous - 1 <= max_gap):
+                previous = row
+                continue
+            data.append({
+                'range': block_range(tab_name, column_to_letter(first), start, column_to_letter(last), previous),
+                'values': [[grid[column].get(block_row) for column in columns] for block_row in range(start, previous + 1)]
+            })
+            start = previous = row
+    return data
+
+
+def _column_runs(columns):
+    """Group sorted column numbers into (first, last) runs of adjacent columns."""
+    runs = []
+    for column in columns:
+        if runs and column == runs[-1][1] + 1:
+            runs[-1][1] = column
+        else:
+            runs.append([column, column])
+    return [tuple(run) for run in runs]
+
+
+def _range_cells(value_range):
+    return sum(len(row) for row in value_range['values'])
+
+
+def chunk_data(data, max_cells=CHUNK_CELLS, max_bytes=CHUNK_BYTES):
+    """Split value ranges into batches of at most max_cells cells and roughly max_bytes of JSON.
+
+    A range larger than a batch is split by rows.
+    """
+    chunks = []
+    chunk, cells, size = [], 0, 0
+    for value_range in data:
+        for piece in _split_range(value_range, max_cells):
+            piece_cells = _range_cells(piece)
+            piece_size = len(json.dumps(piece))
+            if chunk and (cells + piece_cells > max_cells or size + piece_size > max_bytes):
+                chunks.append(chunk)
+                chunk, cells, size = [], 0, 0
+            chunk.append(piece)
+            cells += piece_cells
+            size += piece_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _split_range(value_range, max_cells):
+    values = value_range['values']
+    width = max(len(row) for row in values) if values else 1
+    max_rows = max(1, max_cells // width)
+    if len(values) <= max_rows:
+        return [value_range]
+    tab_name, cells = split_range(value_range['range'])
+    first, last = cells.split(':')
+    first_column, start = split_cell(first)
+    last_column, _ = split_cell(last)
+    pieces = []
+    for offset in range(0, len(values), max_rows):
+        rows = values[offset:offset + max_rows]
+        pieces.append({'range': block_range(tab_name, first_column, start + offset, last_column, start + offset + len(rows) - 1),
+                       'values': rows})
+    return pieces
+
+
+class WriteError(Exception):
+    """A write job that failed part way: the chunks before the failure were written and journaled.
+
+    error is the exception of the failed chunk, stats the statistics of the job so far (see
+    write_ranges) and written the value ranges that were written, by this run or an earlier one.
+    """
+
+    def __init__(self, error, stats, written):
+        super().__init__(str(error))
+        self.error = error
+        self.stats = stats
+        self.written = written
+
+    def written_cells(self):
+        """Return the set of (row, column letter) of the cells covered by the written ranges."""
+        cells = set()
+        for value_range in self.written:
+            first, _, last = split_range(value_range['range'])[1].partition(':')
+            first_column, first_row = split_cell(first)
+            last_column, last_row = split_cell(last or first)
+            columns = [column_to_letter(column)
+                       for column in range(letter_to_column(first_column), letter_to_column(last_column) + 1)]
+            cells.update((row, column) for row in range(first_row, last_row + 1) for column in columns)
+        return cells
+
+
+class Journal:
+    """Records the chunks of a write job that completed, so an interrupted job can resume."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as journal:
+                self.done = set(json.load(journal).get('done', []))
+
+    def mark(self, chunk_index):
+        self.done.add(chunk_index)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as journal:
+            json.dump({'done': sorted(self.done)}, journal)
+        os.replace(self.path + '.tmp', self.path)
+
+    def clear(self):
+        self.done.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def journal_path(sheet_id, chunks, journal_dir=None):
+    """Journal file of a write job, keyed by the sheet and the exact data written."""
+    digest = hashlib.sha1(json.dumps([sheet_id, chunks], sort_keys=True).encode()).hexdigest()
+    return os.path.join(journal_dir or JOURNAL_DIR, f"{sheet_id}-{digest[:16]}.json")
+
+
+def write_ranges(service, sheet_id, data, journal_dir=None, progress=None):
+    """Write value ranges in size-bounded batchUpdate chunks, resuming an interrupted identical job.
+
+    The journal is kept in journal_dir, JOURNAL_DIR by default.
+    progress, if given, is called with a status message after each chunk.
+    Returns statistics of the job (cells, requests, retries, skipped chunks, seconds, cells per second).
+    A chunk that still fails after its retries raises a WriteError telling which ranges were written.
+    """
+    chunks = chunk_data(data)
+    journal = Journal(journal_path(sheet_id, chunks, journal_dir))
+    stats = {'cells': 0, 'requests': 0, 'retries': 0, 'skipped_chunks': 0}
+    written = []
+    start = time.monotonic()
+
+    def on_retry(error, delay):
+        stats['retries'] += 1
+        if progress:
+            progress(f"HTTP {error.resp.status}, retrying in {delay:.1f}s")
+
+    for index, chunk in enumerate(chunks):
+        if index in journal.done:
+            stats['skipped_chunks'] += 1
+            written.extend(chunk)
+            continue
+        body = {'valueInputOption': 'RAW', 'data': chunk}
+        request = service.spreadsheets().values().batchUpdate(spreadsheetId=sheet_id, body=body)
+        try:
+            execute_with_retry(request, on_retry=on_retry)
+        except Exception as error:
+            stats['seconds'] = time.monotonic() - start
+            raise WriteError(error, stats, written) from error
+        written.extend(chunk)
+        stats['requests'] += 1
+        stats['cells'] += sum(value is not None for value_range in chunk for row in value_range['values'] for value in row)
+        journal.mark(index)
+        if progress:
+            elapsed = time.monotonic() - start
+            progress(f"Wrote chunk {index + 1} of {len(chunks)} ({stats['cells'] / max(elapsed, 1e-6):.0f} cells/s)")
+
+    journal.clear()
+    stats['seconds'] = time.monotonic() - start
+    stats['cells_per_second'] = stats['cells'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
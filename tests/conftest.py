@@ -0,0 +1,38 @@
+import pytest
+from linker import drive, writer
+from linker.cache import cache
+from linker.emulator import Emulator
+from linker.scheduler import LIMITS, scheduler
+from linker.services import ServiceRegistry
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    # The caches, the listing store and the scheduler are shared by the whole process
+    cache.clear()
+    drive.use_store(None)
+    scheduler.configure({})
+    yield
+    cache.clear()
+    drive.use_store(None)
+    scheduler.configure(LIMITS)
+
+
+@pytest.fixture(autouse=True)
+def journal_dir(tmp_path, monkeypatch):
+    # Keep the write journals of the tests out of the project's .link_journal
+    directory = tmp_path / 'journal'
+    monkeypatch.setattr(writer, 'JOURNAL_DIR', str(directory))
+    return directory
+
+
+@pytest.fixture
+def emulator():
+    # The emulator raises googleapiclient's HttpError like the real services
+    pytest.importorskip('googleapiclient')
+    return Emulator(folders=2, files=50, sheets=2, rows=100, seed=3)
+
+
+@pytest.fixture
+def registry(emulator):
+    return ServiceRegistry(emulator=emulator)
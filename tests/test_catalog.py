@@ -0,0 +1,36 @@
+from linker import catalog
+from linker.catalog import SheetCatalog, words
+
+SHEETS = [{'id': 's1', 'name': 'Budget 2024'}, {'id': 's2', 'name': 'budget draft'},
+          {'id': 's3', 'name': 'Payroll Q1'}, {'id': 's4', 'name': 'Q1 Budget review'}]
+
+
+def test_words():
+    assert words("Q1 '24 Budget-Draft") == ['q1', '24', 'budget', 'draft']
+
+
+def test_search_matches_word_prefixes_sorted_by_name():
+    sheets = SheetCatalog(SHEETS)
+    assert sheets.search('bud') == [('Budget 2024', 's1'), ('budget draft', 's2'), ('Q1 Budget review', 's4')]
+    assert sheets.search('q1 BUD') == [('Q1 Budget review', 's4')]
+    assert sheets.search('get') == []
+
+
+def test_empty_query_lists_everything_up_to_limit():
+    sheets = SheetCatalog(SHEETS)
+    assert len(sheets.search('')) == 4
+    assert sheets.search('', limit=2) == [('Budget 2024', 's1'), ('budget draft', 's2')]
+
+
+def test_sheets_added_page_by_page():
+    sheets = SheetCatalog(SHEETS[:2])
+    assert sheets.search('payroll') == []
+    sheets.add(SHEETS[1:])
+    assert len(sheets) == 4
+    assert sheets.search('payroll') == [('Payroll Q1', 's3')]
+
+
+def test_walk_of_common_prefix_respects_limit(monkeypatch):
+    monkeypatch.setattr(catalog, 'WALK_FACTOR', 1)
+    sheets = SheetCatalog({'id': f"s{number}", 'name': f"Sheet {number:03d}"} for number in range(50))
+    assert sheets.search('sheet 00', limit=3) == [('Sheet 000', 's0'), ('Sheet 001', 's1'), ('Sheet 002', 's2')]
@@ -0,0 +1,53 @@
+from linker import listing
+from linker.keys import default_extractor
+from linker.listing import NO_KEY, Listing, StringArena
+
+
+def test_string_arena_reads_back_strings_across_segments(monkeypatch):
+    monkeypatch.setattr(listing, 'SEGMENT_SIZE', 8)
+    strings = ['', 'alpha', 'b', '', 'gamma-delta', 'é', 'x' * 20, '']
+    arena = StringArena()
+    for position, string in enumerate(strings):
+        arena.append(string)
+        if position % 3 == 0:
+            arena.flush()
+            assert arena[position] == string
+    assert list(arena) == strings
+    assert [arena[position] for position in range(len(strings))] == strings
+    assert len(arena._segments) > 1
+
+
+def test_listing_filled_page_by_page():
+    files = Listing()
+    for page in range(5):
+        files.extend({'id': f"id{number}", 'name': f"{number}# Doc.pdf", 'mimeType': 'application/pdf'}
+                     for number in range(page * 100, page * 100 + 100))
+    assert len(files) == 500
+    assert files.id(0) == 'id0' and files.name(499) == '499# Doc.pdf'
+    assert [row[0] for row in files.rows()] == [f"id{number}" for number in range(500)]
+
+
+def test_listing_counts_and_ids_by_mime_type():
+    files = Listing([{'id': 'a', 'name': 'A', 'mimeType': 'application/vnd.google-apps.folder'},
+                     {'id': 'b', 'name': '1# B.pdf', 'mimeType': 'application/pdf'},
+                     {'id': 'c', 'name': 'C'}])
+    assert files.count('application/pdf') == 1
+    assert files.count(exclude='application/vnd.google-apps.folder') == 2
+    assert files.ids('application/vnd.google-apps.folder') == ['a']
+    assert files.mime_type(2) is None
+    assert Listing.from_rows(files.rows()).to_dicts() == files.to_dicts()
+
+
+def test_listing_keeps_hundreds_of_mime_types():
+    files = Listing([{'id': str(number), 'name': 'x', 'mimeType': f"application/x-type{number}"} for number in range(300)])
+    assert files.mime_type(299) == 'application/x-type299'
+    assert files.count('application/x-type256') == 1
+
+
+def test_listing_keys():
+    files = Listing([{'id': 'a', 'name': '0042# A.pdf'}, {'id': 'b', 'name': 'none.pdf'},
+                     {'id': 'c', 'name': f"{10 ** 30}# C.pdf"}])
+    codes, text_keys, labels = files.keys(default_extractor)
+    assert list(codes) == [42, NO_KEY, -2]
+    assert text_keys == [str(10 ** 30)]
+    assert labels == {0: '0042'}
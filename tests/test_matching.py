@@ -0,0 +1,62 @@
+from linker.keys import KeyExtractor
+from linker.matching import build_document_index, index_cells, match_cells, match_rows
+
+
+def files(*names):
+    return [{'id': f"f{position}", 'name': name, 'mimeType': 'application/pdf'} for position, name in enumerate(names)]
+
+
+def found(matches):
+    return {match.file_name: (match.row, match.column) for match in matches}
+
+
+def test_exact_match_normalizes_ids_and_prefers_the_id_column():
+    index = build_document_index(files('00123# Scan.pdf', '456# Form.pdf', 'notes.txt'))
+    rows = [(2, '0123', '555'), (3, '999', '456'), (4, '456', '')]
+    matches = match_rows(index, rows, 'B', 'C')
+    assert found(matches) == {'00123# Scan.pdf': (2, 'B'), '456# Form.pdf': (3, 'C')}
+    assert [match.index for match in matches] == ['00123', '456']
+
+
+def test_exact_match_takes_the_earliest_row():
+    index = build_document_index(files('77# A.pdf'))
+    assert found(match_rows(index, [(5, '77', ''), (9, '77', '')], 'B', 'C')) == {'77# A.pdf': (5, 'B')}
+
+
+def test_duplicate_files_all_match():
+    index = build_document_index(files('8# A.pdf', '8# B.pdf'))
+    assert found(match_rows(index, [(2, '8', '')], 'B', 'C')) == {'8# A.pdf': (2, 'B'), '8# B.pdf': (2, 'B')}
+
+
+def test_prefix_match():
+    index = build_document_index(files('12345# A.pdf'))
+    rows = [(2, '1234', ''), (3, '12345-B', '')]
+    assert match_rows(index, rows, 'B', 'C') == []
+    assert found(match_rows(index, rows, 'B', 'C', mode='prefix')) == {'12345# A.pdf': (3, 'B')}
+
+
+def test_contains_match_finds_formatted_phone_numbers():
+    index = build_document_index(files('712345678# A.pdf'))
+    rows = [(2, '', '+254 712-345 678')]
+    assert match_rows(index, rows, 'B', 'C', mode='prefix') == []
+    assert found(match_rows(index, rows, 'B', 'C', mode='contains')) == {'712345678# A.pdf': (2, 'C')}
+
+
+def test_exact_match_wins_over_partial():
+    index = build_document_index(files('555# A.pdf'))
+    rows = [(2, '555-X', ''), (5, '555', '')]
+    assert found(match_rows(index, rows, 'B', 'C', mode='contains')) == {'555# A.pdf': (5, 'B')}
+
+
+def test_custom_key_patterns():
+    extractor = KeyExtractor.from_specs([{'pattern': r'INV-(?P<key>\w+)', 'normalize': 'casefold'}])
+    index = build_document_index(files('INV-Ab12 march.pdf'), extractor)
+    assert found(match_rows(index, [(2, 'ab12', '')], 'B', 'C', extractor)) == {'INV-Ab12 march.pdf': (2, 'B')}
+
+
+def test_match_cells_agrees_with_match_rows():
+    index = build_document_index(files('100# A.pdf', '200# B.pdf', '300# C.pdf'))
+    rows = [(2, '100', ''), (3, 'x', '200'), (4, '300-1', '')]
+    for mode in ('exact', 'prefix', 'contains'):
+        cells = index_cells(rows, 'B', 'C', mode=mode)
+        assert found(match_cells(index, cells, mode=mode)) == found(match_rows(index, rows, 'B', 'C', mode=mode))
@@ -0,0 +1,45 @@
+from linker import cli, pipeline
+from linker.emulator import http_error
+
+JOBS = [{'folder': 'folder0000', 'sheet': 'sheet0000', 'tab': 'Sheet1', 'id_col': 'B', 'phone_col': 'C'},
+        {'folder': 'folder0001', 'sheet': 'sheet0000', 'tab': 'Sheet1', 'id_col': 'B', 'phone_col': 'C'},
+        {'folder': 'folder0001', 'sheet': 'sheet0001', 'tab': 'Sheet1', 'id_col': 'B', 'phone_col': 'C',
+         'link_col': 'F'}]
+
+
+def test_fan_out_links_every_target(registry, emulator):
+    results = pipeline.run_fan_out(registry, JOBS)
+    assert [result['error'] for result in results] == [None, None, None]
+    assert results[2]['linked'] == len(results[2]['matches']) > 0
+
+
+def test_failing_folder_only_fails_its_jobs(registry, monkeypatch):
+    list_files = pipeline.list_files
+
+    def forbidden(service, folder_id, *args, **kwargs):
+        if folder_id == 'folder0001':
+            raise http_error(403, 'Forbidden')
+        return list_files(service, folder_id, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, 'list_files', forbidden)
+    results = pipeline.run_fan_out(registry, JOBS)
+    assert results[0]['error'] is None and results[0]['matches']
+    assert all('folder0001' in result['error'] for result in results[1:])
+
+
+def test_run_jobs_reports_prefetch_errors(emulator, monkeypatch, capsys):
+    list_files_many = cli.list_files_many
+
+    def forbidden(service, folder_ids, **kwargs):
+        listings, errors = list_files_many(service, [folder_id for folder_id in folder_ids if folder_id != 'folder0001'],
+                                           **kwargs)
+        errors['folder0001'] = http_error(403, 'Forbidden')
+        return listings, errors
+
+    monkeypatch.setattr(cli, 'list_files_many', forbidden)
+    jobs = JOBS + [dict(JOBS[0], tab='Missing')]
+    results = cli.run_jobs(jobs, emulator=emulator)
+    assert results[0]['error'] is None
+    assert all('folder0001' in result['error'] for result in results[1:3])
+    assert "Tab 'Missing' not found" in results[3]['error']
+    assert 'folder0001' in capsys.readouterr().err
@@ -0,0 +1,62 @@
+import threading
+import time
+from linker.scheduler import LANES, TokenBucket, bucket_name, lane, current_lane, retry_after
+
+
+def test_bucket_names():
+    assert bucket_name('drive GET files') == 'drive_read'
+    assert bucket_name('sheets GET values:batchGet') == 'sheets_read'
+    assert bucket_name('sheets POST values:batchUpdate') == 'sheets_write'
+    assert bucket_name('drive GET discovery') is None
+
+
+def test_lane_is_per_thread_and_restored():
+    assert current_lane() == 'interactive'
+    seen = []
+    with lane('bulk'):
+        thread = threading.Thread(target=lambda: seen.append(current_lane()))
+        thread.start()
+        thread.join()
+        assert current_lane() == 'bulk'
+    assert current_lane() == 'interactive'
+    assert seen == ['interactive']
+
+
+def test_retry_after():
+    assert retry_after({'retry-after': '3'}) == 3.0
+    assert retry_after({}) is None
+    assert retry_after(None) is None
+
+
+def test_full_bucket_does_not_wait():
+    bucket = TokenBucket(60)
+    assert bucket.acquire(cost=10) < 0.05
+
+
+def test_interactive_lane_overtakes_bulk_waiters():
+    bucket = TokenBucket(600)  # 10 tokens per second
+    bucket.tokens = 0.0
+    served = []
+
+    def take(name):
+        bucket.acquire(priority=LANES.index(name))
+        served.append(name)
+
+    bulk = threading.Thread(target=take, args=('bulk',))
+    bulk.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=take, args=('interactive',))
+    interactive.start()
+    bulk.join()
+    interactive.join()
+    assert served == ['interactive', 'bulk']
+
+
+def test_throttle_pauses_and_halves_the_rate_then_recovers():
+    bucket = TokenBucket(600)
+    bucket.throttle(0.1)
+    assert bucket.rate == bucket.full_rate / 2
+    assert bucket.acquire() >= 0.09
+    for _ in range(20):
+        bucket.recover()
+    assert bucket.rate == bucket.full_rate
@@ -0,0 +1,63 @@
+from linker.pipeline import search_matches
+from linker.sheets import diff_links, link_matches, read_rows, relink_matches
+
+
+def link_column(emulator, sheet_id='sheet0000', tab='Sheet1'):
+    return {number: row[5] for number, row in enumerate(emulator.spreadsheets[sheet_id]['tabs'][tab], start=1)
+            if len(row) > 5 and row[5]}
+
+
+def test_relink_of_unchanged_links_writes_nothing(registry, emulator):
+    sheets = registry.sheets()
+    matches = search_matches(registry.drive(), sheets, 'folder0001', 'sheet0000', 'Sheet1', 'B', 'C')
+    assert matches
+    stats = link_matches(sheets, 'sheet0000', 'Sheet1', matches, ['F'])
+    assert stats['cells'] == len({match.row for match in matches})
+
+    stats = relink_matches(sheets, 'sheet0000', 'Sheet1', matches, ['F'])
+    assert stats['requests'] == 0 and stats['cells'] == 0
+    assert stats['added'] == stats['changed'] == stats['stale'] == stats['conflicts'] == 0
+
+
+def test_diff_links_sorts_cells_and_matches_by_outcome(registry, emulator):
+    sheets = registry.sheets()
+    matches = search_matches(registry.drive(), sheets, 'folder0001', 'sheet0000', 'Sheet1', 'B', 'C')
+    link_matches(sheets, 'sheet0000', 'Sheet1', matches, ['F'])
+    rows = emulator.spreadsheets['sheet0000']['tabs']['Sheet1']
+    conflict, changed, gone = matches[0], matches[1], matches[2]
+    rows[conflict.row - 1][5] = 'see paper file'
+    rows[changed.row - 1][5] = 'https://drive.google.com/file/d/old/view'
+    others = [match for match in matches if match.row != gone.row]
+
+    plan = diff_links(sheets, 'sheet0000', 'Sheet1', others, ['F'])
+    assert (plan['conflicts'], plan['changed'], plan['stale']) == (1, 1, 1)
+    assert plan['cells'] == [(changed.row, 'F', changed.url)]
+    assert plan['clear'] == [(gone.row, 'F', '')]
+    assert plan['outcomes']['conflicts'] == [conflict]
+    assert plan['outcomes']['written'] == [changed]
+
+    relink_matches(sheets, 'sheet0000', 'Sheet1', others, ['F'], clear_stale=True)
+    links = link_column(emulator)
+    assert links[conflict.row] == 'see paper file'
+    assert links[changed.row] == changed.url
+    assert gone.row not in links
+
+
+def test_dry_run_writes_nothing(registry, emulator):
+    sheets = registry.sheets()
+    matches = search_matches(registry.drive(), sheets, 'folder0001', 'sheet0000', 'Sheet1', 'B', 'C')
+    stats = relink_matches(sheets, 'sheet0000', 'Sheet1', matches, ['F'], dry_run=True)
+    assert stats['dry_run'] and stats['added'] == len(matches)
+    assert link_column(emulator) == {}
+
+
+def test_tabs_needing_quotes_are_read_and_written(registry, emulator):
+    spreadsheet = emulator.spreadsheets['sheet0000']
+    spreadsheet['tabs']["Q1 '24"] = spreadsheet['tabs'].pop('Sheet1')
+    spreadsheet['columns']["Q1 '24"] = spreadsheet['columns'].pop('Sheet1')
+    sheets = registry.sheets()
+    matches = search_matches(registry.drive(), sheets, 'folder0001', 'sheet0000', "Q1 '24", 'B', 'C')
+    assert matches
+    link_matches(sheets, 'sheet0000', "Q1 '24", matches, ['F'])
+    assert len(link_column(emulator, tab="Q1 '24")) == len({match.row for match in matches})
+    assert next(read_rows(sheets, 'sheet0000', "Q1 '24", ['A']))[1] == ['Name']
@@ -0,0 +1,39 @@
+from linker import drive
+from linker.listing import Listing
+from linker.store import ListingStore
+
+
+def pdf(file_id, name, parent, trashed=False):
+    return {'fileId': file_id, 'removed': False,
+            'file': {'id': file_id, 'name': name, 'mimeType': 'application/pdf', 'parents': [parent],
+                     'trashed': trashed}}
+
+
+def test_apply_changes_adds_renames_moves_and_removes(tmp_path):
+    store = ListingStore(str(tmp_path / 'cache.sqlite'))
+    store.save_listing('a', Listing([{'id': '1', 'name': '1# One.pdf'}, {'id': '2', 'name': '2# Two.pdf'},
+                                     {'id': '3', 'name': '3# Three.pdf'}]))
+    store.save_listing('b', Listing())
+    store.apply_changes([pdf('1', '1# One v2.pdf', 'a'), pdf('2', '2# Two.pdf', 'b'), pdf('3', '3# Three.pdf', 'a', True),
+                         pdf('4', '4# Four.pdf', 'a'), pdf('5', '5# Five.pdf', 'elsewhere'),
+                         {'fileId': '9', 'removed': True}])
+    assert [row[:2] for row in store.get_listing('a').rows()] == [('1', '1# One v2.pdf'), ('4', '4# Four.pdf')]
+    assert [row[:2] for row in store.get_listing('b').rows()] == [('2', '2# Two.pdf')]
+    assert store.get_listing('elsewhere') is None
+    store.close()
+
+
+def test_store_syncs_drive_changes(registry, emulator, tmp_path):
+    store = ListingStore(str(tmp_path / 'cache.sqlite'))
+    service = registry.drive()
+    assert store.sync(service) == 0  # records the start page token
+    drive.use_store(store)
+    listing = drive.list_files(service, 'folder0001')
+    assert len(listing) == 50
+
+    emulator.add_file('123# New.pdf', 'folder0001')
+    emulator.trash_file(listing.id(0))
+    assert store.sync(service, force=True) == 2
+    names = [row[1] for row in store.get_listing('folder0001').rows()]
+    assert len(names) == 50 and '123# New.pdf' in names and listing.name(0) not in names
+    store.close()
@@ -0,0 +1,58 @@
+from linker.emulator import http_error
+from linker.watch import Watcher
+
+JOB = {'folder': 'folder0001', 'sheet': 'sheet0000', 'tab': 'Sheet1', 'id_col': 'B', 'phone_col': 'C', 'link_col': 'F'}
+
+
+def sheet_ids(emulator):
+    return [row[1] for row in emulator.spreadsheets['sheet0000']['tabs']['Sheet1'][1:]]
+
+
+def links(emulator):
+    return [row[5] for row in emulator.spreadsheets['sheet0000']['tabs']['Sheet1'] if len(row) > 5 and row[5]]
+
+
+def test_poll_links_new_files(registry, emulator):
+    watcher = Watcher(registry, [JOB])
+    assert [result['error'] for result in watcher.start()] == [None]
+    before = len(links(emulator))
+    emulator.add_file(f"{sheet_ids(emulator)[0]}# New.pdf", 'folder0001')
+    emulator.add_file('1# Elsewhere.pdf', 'folder0000')
+    results = watcher.poll()
+    assert [result['linked'] for result in results] == [1]
+    assert len(links(emulator)) == before + 1
+
+
+def test_failed_poll_is_retried_from_the_same_token(registry, emulator):
+    errors = []
+    watcher = Watcher(registry, [JOB], on_error=errors.append)
+    watcher.start(catch_up=False)
+    token = watcher.page_token
+    file = emulator.add_file(f"{sheet_ids(emulator)[0]}# New.pdf", 'folder0001')
+
+    emulator.settings.update(error_rate=1.0, error_statuses='403')
+    assert watcher.poll() == []
+    assert len(errors) == 1 and watcher.page_token == token
+
+    emulator.settings['error_rate'] = 0.0
+    results = watcher.poll()
+    assert [match.file_id for match in results[0]['matches']] == [file['id']]
+
+
+def test_unreadable_sheet_keeps_its_files_until_it_can_be_read(registry, emulator, monkeypatch):
+    call = emulator.call
+
+    def sheets_forbidden(api, handler):
+        if api == 'sheets':
+            raise http_error(403, 'Forbidden')
+        return call(api, handler)
+
+    watcher = Watcher(registry, [JOB])
+    monkeypatch.setattr(emulator, 'call', sheets_forbidden)
+    assert [bool(result['error']) for result in watcher.start()] == [True, True]
+    emulator.add_file(f"{sheet_ids(emulator)[0]}# New.pdf", 'folder0001')
+    assert watcher.poll()[0]['error']
+
+    monkeypatch.setattr(emulator, 'call', call)
+    results = watcher.poll()
+    assert [result['linked'] for result in results] == [1]
@@ -0,0 +1,68 @@
+import functools
+import pytest
+from linker import writer
+from linker.writer import WriteError, chunk_data, coalesce_ranges, write_ranges
+
+
+def test_coalesce_bridges_small_gaps_with_nulls():
+    data = coalesce_ranges('Sheet1', [(2, 'F', 'a'), (4, 'F', 'b'), (20, 'F', 'c')], max_gap=2)
+    assert data == [{'range': "'Sheet1'!F2:F4", 'values': [['a'], [None], ['b']]},
+                    {'range': "'Sheet1'!F20:F20", 'values': [['c']]}]
+
+
+def test_coalesce_merges_adjacent_columns_only():
+    data = coalesce_ranges('Sheet1', [(2, 'F', 'a'), (2, 'G', 'b'), (2, 'J', 'c')])
+    assert [value_range['range'] for value_range in data] == ["'Sheet1'!F2:G2", "'Sheet1'!J2:J2"]
+    assert data[0]['values'] == [['a', 'b']]
+
+
+def test_coalesce_quotes_tab_names():
+    data = coalesce_ranges("Q1 '24", [(1, 'A', 'x')])
+    assert data[0]['range'] == "'Q1 ''24'!A1:A1"
+
+
+def test_chunks_split_large_ranges_by_rows():
+    data = coalesce_ranges("Q1 '24", [(row, 'B', str(row)) for row in range(1, 26)])
+    chunks = chunk_data(data, max_cells=10)
+    assert [[piece['range'] for piece in chunk] for chunk in chunks] == [
+        ["'Q1 ''24'!B1:B10"], ["'Q1 ''24'!B11:B20"], ["'Q1 ''24'!B21:B25"]]
+    assert [value for chunk in chunks for piece in chunk for row in piece['values'] for value in row] == \
+        [str(row) for row in range(1, 26)]
+
+
+def test_chunks_respect_the_byte_bound():
+    data = coalesce_ranges('Sheet1', [(row, 'A', 'x' * 100) for row in range(1, 40, 10)])
+    # Each range takes about 145 bytes of JSON
+    assert [len(chunk) for chunk in chunk_data(data, max_bytes=300)] == [2, 2]
+    assert [len(chunk) for chunk in chunk_data(data, max_bytes=200)] == [1, 1, 1, 1]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(writer, 'chunk_data', functools.partial(chunk_data, max_cells=10))
+
+
+def test_failed_write_reports_written_cells_and_resumes(registry, emulator, small_chunks, monkeypatch, journal_dir):
+    data = coalesce_ranges('Sheet1', [(row, 'F', f"url{row}") for row in range(2, 32)])
+    execute = writer.execute_with_retry
+    calls = []
+
+    def fail_third(request, **kwargs):
+        calls.append(request)
+        if len(calls) == 3:
+            raise RuntimeError('connection reset')
+        return execute(request, **kwargs)
+
+    monkeypatch.setattr(writer, 'execute_with_retry', fail_third)
+    with pytest.raises(WriteError) as failure:
+        write_ranges(registry.sheets(), 'sheet0000', data)
+    assert failure.value.stats['requests'] == 2
+    assert failure.value.written_cells() == {(row, 'F') for row in range(2, 22)}
+    assert len(list(journal_dir.iterdir())) == 1
+
+    monkeypatch.setattr(writer, 'execute_with_retry', execute)
+    stats = write_ranges(registry.sheets(), 'sheet0000', data)
+    assert stats['skipped_chunks'] == 2 and stats['requests'] == 1
+    assert [row[5] for row in emulator.spreadsheets['sheet0000']['tabs']['Sheet1'][1:31]] == \
+        [f"url{row}" for row in range(2, 32)]
+    assert not list(journal_dir.iterdir())
@@ -1,235 +1,229 @@
-import os
 import re
 import tkinter as tk
 from tkinter import messagebox, ttk, simpledialog
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-
-# Define Google Drive API and Google Sheets API scopes
-SCOPES = ['https://www.googleapis.com/auth/drive.readonly', 'https://www.googleapis.com/auth/spreadsheets']
-
-# Memoization cache
-memo = {}
-urls = []  # Initialize the list to store URLs
-
-def authenticate():
-    """Authenticate with Google APIs."""
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json')
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            # Construct the path to credentials.json dynamically
-            script_dir = os.path.dirname(os.path.realpath(__file__))
-            credentials_path = os.path.join(script_dir, 'credentials.json')
-            flow = InstalledAppFlow.from_client_secrets_file(credentials_path, SCOPES)
-            creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-    return creds
-def get_data(sheet_id, tab_name):
-    """Retrieve all values in the specified Google Sheet tab."""
-    creds = authenticate()
-    service = build('sheets', 'v4', credentials=creds)
-    range_name = f"{tab_name}!A:Z"
-    result = service.spreadsheets().values().get(spreadsheetId=sheet_id, range=range_name).execute()
-    return result.get('values', [])
+from linker.catalog import SheetCatalog, words
+from linker.crawler import count_documents, crawl
+from linker.drive import list_folders, list_google_sheets, use_store
+from linker.metrics import format_report, metrics
+from linker.pipeline import search_matches
+from linker.results import ResultsModel
+from linker.results_view import ResultsView
+from linker.scheduler import scheduler
+from linker.services import drive_service, registry, sheets_service
+from linker.store import ListingStore
+from linker.sheets import (diff_links, format_plan, get_non_empty_columns, link_matches, list_columns, list_tabs,
+                           parse_sheet_id, write_plan)
+from linker.tasks import TaskRunner
+from linker.writer import WriteError
+
+results = ResultsModel()  # Match records of the last search
+
+# Sheets shown at once in the sheet picker; typing narrows them down
+MAX_SHOWN_SHEETS = 500
+
 def select_folder():
     """Select Google Drive folder."""
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
-    folders, total_documents = list_folders(service)
-    if folders:
-        folder_names = [folder['name'] for folder in folders]
-        selected_folder = simpledialog.askstring("Select Folder", f"Select Google Drive Folder\nTotal Documents: {total_documents}", initialvalue=folder_names[0],
-                                                 parent=root)
-        if selected_folder:
-            folder_id = [folder['id'] for folder in folders if folder['name'] == selected_folder][0]
-            folder_entry.delete(0, tk.END)
-            folder_entry.insert(tk.END, folder_id)
-    else:
-        messagebox.showerror("Error", "No folders found in Google Drive.")
+    run_task(lambda task: list_folders(drive_service()), show_folder_list)
 
-def list_folders(service):
-    """List available folders in the Google Drive along with the total number of documents."""
-    # Check if folders list is already cached
-    if 'folders' in memo:
-        return memo['folders']
-
-    results = service.files().list(
-        q="mimeType='application/vnd.google-apps.folder'",
-        fields="files(id, name)").execute()
-    folders = results.get('files', [])
-    folder_count = len(folders)
+def show_folder_list(folders):
+    """Show the Google Drive folders at once and fill in their document counts as they arrive."""
+    if not folders:
+        messagebox.showerror("Error", "No folders found in Google Drive.")
+        return
 
-    # Iterate over each folder to count the total number of documents
-    total_documents = 0
+    folder_list_window = tk.Toplevel(root)
+    folder_list_window.title("Select Google Drive Folder")
+    folder_list_window.geometry("300x300")
+    total_label = tk.Label(folder_list_window, text="Total Documents: counting...")
+    total_label.pack()
+    folder_listbox = tk.Listbox(folder_list_window, selectmode="single")
+    folder_listbox.pack(expand=True, fill="both")
     for folder in folders:
-        folder_id = folder['id']
-        # Reset the total_documents count for each folder iteration
-        documents_result = list_files(service, folder_id)
-        total_documents += len(documents_result)/2
-
-    # Cache the folders list
-    memo['folders'] = (folders, total_documents)
-    return memo['folders']
-
-def list_files(service, folder_id):
-    """List all files in the Google Drive folder."""
-    # Check if folder files list is already cached
-    if folder_id in memo:
-        return memo[folder_id]
-
-    files = []
-    page_token = None
-    while True:
-        response = service.files().list(q=f"'{folder_id}' in parents",
-                                        fields="nextPageToken, files(id, name)",
-                                        pageToken=page_token).execute()
-        files.extend(response.get('files', []))
-        page_token = response.get('nextPageToken')
-        if not page_token:
-            break
-
-    # Cache the folder files list
-    memo[folder_id] = files
-    return files
+        folder_listbox.insert(tk.END, folder['name'])
+
+    positions = {folder['id']: idx for idx, folder in enumerate(folders)}
+    counts = {}
+
+    def on_count(update):
+        folder_id, count = update
+        counts[folder_id] = count
+        idx = positions[folder_id]
+        selection = folder_listbox.curselection()
+        folder_listbox.delete(idx)
+        folder_listbox.insert(idx, f"{folders[idx]['name']} ({count})")
+        if idx in selection:
+            folder_listbox.selection_set(idx)
+        total_label.config(text=f"Total Documents: {sum(counts.values())} ({len(counts)} of {len(folders)} folders)")
+
+    def count_folders(task):
+        crawl(registry, list(positions),
+              on_folder=lambda folder_id, files: task.progress((folder_id, count_documents(files))))
+
+    count_task = runner.submit(count_folders, on_progress=on_count)
+
+    def on_close():
+        count_task.cancel()
+        folder_list_window.destroy()
+
+    def on_ok():
+        selection = folder_listbox.curselection()
+        if selection:
+            folder_entry.delete(0, tk.END)
+            folder_entry.insert(tk.END, folders[selection[0]]['id'])
+        on_close()
 
-def select_sheet():
-    """Select Google Sheet from a list."""
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
-    sheets = list_google_sheets(service)
-    if sheets:
-        sheet_names = [sheet['name'] for sheet in sheets]
-        sheet_list_window = tk.Toplevel(root)
-        sheet_list_window.title("Select Google Sheet")
-        sheet_list_window.geometry("300x200")
-        selected_sheet = tk.StringVar(value=sheet_names[0])
-        sheet_listbox = tk.Listbox(sheet_list_window, listvariable=selected_sheet, selectmode="single")
-        sheet_listbox.pack(expand=True, fill="both")
-        for sheet_name in sheet_names:
-            sheet_listbox.insert(tk.END, sheet_name)
-
-        selected_columns = {'IDs': None, 'Phone number': None}
-
-        def on_ok():
-            selected_sheet_name = sheet_listbox.get(tk.ACTIVE)
-            sheet_entry.delete(0, tk.END)
-            sheet_entry.insert(tk.END, selected_sheet_name)  # Update Sheet Name entry field
-
-            sheet = [sheet for sheet in sheets if sheet['name'] == selected_sheet_name][0]
-            sheet_id = sheet['id']
-            sheet_entry.delete(0, tk.END)
-            sheet_entry.insert(tk.END, f"https://docs.google.com/spreadsheets/d/{sheet_id}")
-            service = build('sheets', 'v4', credentials=creds)  # Use Google Sheets API
-            tabs = list_tabs(service, sheet_id)
-            if tabs:
-                select_tab_window = tk.Toplevel(root)
-                select_tab_window.title("Select Tab")
-                select_tab_window.geometry("300x200")
-                selected_tab = tk.StringVar(value=tabs[0])
-                tab_listbox = tk.Listbox(select_tab_window, listvariable=selected_tab, selectmode="single")
-                tab_listbox.pack(expand=True, fill="both")
-                for tab_name in tabs:
-                    tab_listbox.insert(tk.END, tab_name)
-
-                def on_tab_ok():
-                    selected_tab_name = tab_listbox.get(tk.ACTIVE)
-                    tab_entry.delete(0, tk.END)
-                    tab_entry.insert(tk.END, selected_tab_name)
-                    # Now let's list the columns for the selected tab
-                    columns = list_columns(service, sheet_id, selected_tab_name)
-                    if columns:
-                        select_columns(service, sheet_id)
-                    else:
-                        messagebox.showerror("Error", "No columns found in the selected Google Sheets tab.")
-
-                    select_tab_window.destroy()
-
-                tab_ok_button = tk.Button(select_tab_window, text="OK", command=on_tab_ok)
-                tab_ok_button.pack()
+    ok_button = tk.Button(folder_list_window, text="OK", command=on_ok)
+    ok_button.pack()
+    folder_list_window.protocol("WM_DELETE_WINDOW", on_close)
 
+def select_sheet():
+    """Pick a Google Sheet by typing part of its name."""
+    sheet_list_window = tk.Toplevel(root)
+    sheet_list_window.title("Select Google Sheet")
+    sheet_list_window.geometry("400x400")
+    search_entry = tk.Entry(sheet_list_window)
+    search_entry.pack(fill="x")
+    sheet_listbox = tk.Listbox(sheet_list_window, selectmode="single")
+    sheet_listbox.pack(expand=True, fill="both")
+    count_label = tk.Label(sheet_list_window, text="Loading sheets...")
+    count_label.pack()
+
+    # The sheets shown come from the pages listed so far until the worker hands over the
+    # catalog of every sheet, indexed off the UI thread
+    picker = {'catalog': SheetCatalog(), 'shown': [], 'refresh': None, 'lookup': None, 'lookup_task': None,
+              'closed': False}
+
+    def refresh():
+        picker['refresh'] = None
+        if picker['closed']:
+            return
+        catalog = picker['catalog']
+        picker['shown'] = catalog.search(search_entry.get(), limit=MAX_SHOWN_SHEETS)
+        sheet_listbox.delete(0, tk.END)
+        sheet_listbox.insert(tk.END, *(name for name, _ in picker['shown']))
+        if picker['shown']:
+            sheet_listbox.selection_set(0)
+            sheet_listbox.activate(0)
+        count_label.config(text=f"{len(catalog)} sheets" + ("" if catalog.complete else ", loading..."))
+
+    def schedule_refresh(delay=100):
+        # Refresh at most once per delay however fast pages and keystrokes arrive
+        if picker['refresh'] is None and not picker['closed']:
+            picker['refresh'] = sheet_list_window.after(delay, refresh)
+
+    def on_page(page):
+        picker['catalog'].add(page)
+        schedule_refresh(250)
+
+    def load(task):
+        catalog = SheetCatalog(list_google_sheets(drive_service(), on_page=task.progress))
+        catalog.complete = True
+        catalog.index()
+        return catalog
+
+    def on_loaded(catalog):
+        if picker['closed']:
+            return
+        # Keep the sheets found by name meanwhile, in case the full listing came from the cache
+        catalog.add({'id': sheet_id, 'name': name} for sheet_id, name in picker['catalog'].names.items())
+        picker['catalog'] = catalog
+        if not len(catalog):
+            messagebox.showerror("Error", "No Google Sheets found in Google Drive.")
+        schedule_refresh(0)
+
+    def on_key(event=None):
+        schedule_refresh()
+        # Until every sheet is listed, ask Drive for the sheets matching the longest word typed
+        typed = words(search_entry.get())
+        if picker['lookup'] is not None:
+            sheet_list_window.after_cancel(picker['lookup'])
+            picker['lookup'] = None
+        if typed and not picker['catalog'].complete:
+            picker['lookup'] = sheet_list_window.after(300, lambda: look_up(max(typed, key=len)))
+
+    def look_up(text):
+        picker['lookup'] = None
+        if picker['closed']:
+            return
+        # Only the lookup of the latest text is worth finishing
+        cancel_lookup()
+        picker['lookup_task'] = runner.submit(
+            lambda task: list_google_sheets(drive_service(), name_contains=text, on_page=lambda page: task.check()),
+            on_done=on_page)
+
+    def cancel_lookup():
+        if picker['lookup_task'] is not None:
+            picker['lookup_task'].cancel()
+            picker['lookup_task'] = None
+
+    def on_ok(event=None):
+        selection = sheet_listbox.curselection()
+        if not selection:
+            return
+        sheet_id = picker['shown'][selection[0]][1]
+        sheet_entry.delete(0, tk.END)
+        sheet_entry.insert(tk.END, f"https://docs.google.com/spreadsheets/d/{sheet_id}")
+        on_close()
+
+        # List the tabs of the selected sheet using the Google Sheets API
+        run_task(lambda task: list_tabs(sheets_service(), sheet_id),
+                 lambda tabs: show_tab_list(sheet_id, tabs))
+
+    def on_close():
+        picker['closed'] = True
+        load_task.cancel()
+        cancel_lookup()
+        sheet_list_window.destroy()
+
+    search_entry.bind("<KeyRelease>", on_key)
+    search_entry.bind("<Return>", on_ok)
+    sheet_listbox.bind("<Double-1>", on_ok)
+    ok_button = tk.Button(sheet_list_window, text="OK", command=on_ok)
+    ok_button.pack()
+    sheet_list_window.protocol("WM_DELETE_WINDOW", on_close)
+    search_entry.focus_set()
+
+    load_task = runner.submit(load, on_done=on_loaded, on_error=show_task_error, on_progress=on_page)
+
+def show_tab_list(sheet_id, tabs):
+    """Show the list of tabs of a Google Sheet to pick from."""
+    if tabs:
+        select_tab_window = tk.Toplevel(root)
+        select_tab_window.title("Select Tab")
+        select_tab_window.geometry("300x200")
+        selected_tab = tk.StringVar(value=tabs[0])
+        tab_listbox = tk.Listbox(select_tab_window, listvariable=selected_tab, selectmode="single")
+        tab_listbox.pack(expand=True, fill="both")
+        for tab_name in tabs:
+            tab_listbox.insert(tk.END, tab_name)
+
+        def on_columns(columns):
+            if columns:
+                select_columns(sheet_id, columns)
             else:
-                messagebox.showerror("Error", "No tabs found in the selected Google Sheet.")
+                messagebox.showerror("Error", "No columns found in the selected Google Sheets tab.")
 
-            sheet_list_window.destroy()
+        def on_tab_ok():
+            selected_tab_name = tab_listbox.get(tk.ACTIVE)
+            tab_entry.delete(0, tk.END)
+            tab_entry.insert(tk.END, selected_tab_name)
+            select_tab_window.destroy()
+            # Now let's list the columns for the selected tab
+            run_task(lambda task: list_columns(sheets_service(), sheet_id, selected_tab_name), on_columns)
 
-        ok_button = tk.Button(sheet_list_window, text="OK", command=on_ok)
-        ok_button.pack()
+        tab_ok_button = tk.Button(select_tab_window, text="OK", command=on_tab_ok)
+        tab_ok_button.pack()
 
     else:
-        messagebox.showerror("Error", "No Google Sheets found in Google Drive.")
-
-def list_google_sheets(service):
-    """List all Google Sheets in Google Drive."""
-    results = service.files().list(
-        q="mimeType='application/vnd.google-apps.spreadsheet'",
-        fields="files(id, name)").execute()
-    sheets = results.get('files', [])
-    return sheets
-
-def list_tabs(service, sheet_id):
-    """List tabs of a Google Sheet."""
-    sheet = service.spreadsheets().get(spreadsheetId=sheet_id).execute()
-    sheets = sheet.get('sheets', [])
-    tabs = [sheet['properties']['title'] for sheet in sheets]
-    return tabs
-
-def column_to_letter(column):
-    """Convert column number to letter."""
-    letters = ''
-    while column > 0:
-        column, remainder = divmod(column - 1, 26)
-        letters = chr(65 + remainder) + letters
-    return letters
-
-def list_columns(service, sheet_id, tab_name):
-    """List columns of a Google Sheets tab."""
-    # Get the spreadsheet
-    sheet = service.spreadsheets().get(spreadsheetId=sheet_id).execute()
-    sheets = sheet.get('sheets', [])
-
-    # Find the specified tab by name
-    tab = None
-    for s in sheets:
-        if s['properties']['title'] == tab_name:
-            tab = s
-            break
-
-    if not tab:
-        messagebox.showerror("Error", f"Tab '{tab_name}' not found in the Google Sheet.")
-        return []
-
-    # Get the total number of columns in the tab
-    total_columns = tab['properties']['gridProperties']['columnCount']
-
-    # Construct the range from column A to the last column
-    range_name = f"{tab_name}!A1:{column_to_letter(total_columns)}1"
-
-    # Retrieve values from the specified range to get column names
-    result = service.spreadsheets().values().get(spreadsheetId=sheet_id, range=range_name).execute()
-    values = result.get('values', [])
-    columns = values[0] if values else []
-
-    # Create a list of tuples containing column name and its letter identifier
-    column_info = [(col_name, column_to_letter(idx + 1)) for idx, col_name in enumerate(columns)]
-
-    return column_info
-
-def select_columns(service, sheet_id):
+        messagebox.showerror("Error", "No tabs found in the selected Google Sheet.")
+
+def select_columns(sheet_id, columns, selected_columns=None):
     """Select columns for IDs and phone numbers."""
     select_column_window = tk.Toplevel(root)
     select_column_window.title("Select Columns")
     select_column_window.geometry("300x200")
-    selected_columns = []
+    if selected_columns is None:
+        selected_columns = []
 
     def on_column_ok_id():
         selected_column_value = column_listbox.get(tk.ACTIVE)  # Get the selected column value
@@ -242,7 +236,7 @@ def select_columns(service, sheet_id):
                 column_entry.insert(tk.END, selected_column_value.split()[0])
                 select_column_window.destroy()
                 # Call select_columns again to select the second column
-                select_columns(service, sheet_id)
+                select_columns(sheet_id, columns, selected_columns)
             elif len(selected_columns) == 2:
                 phone_entry.delete(0, tk.END)
                 phone_entry.insert(tk.END, selected_column_value.split()[0])
@@ -261,7 +255,7 @@ def select_columns(service, sheet_id):
                 column_entry.insert(tk.END, selected_column_value.split()[0])
                 select_column_window.destroy()
                 # Call select_columns again to select the second column
-                select_columns(service, sheet_id)
+                select_columns(sheet_id, columns, selected_columns)
             elif len(selected_columns) == 2:
                 phone_entry.delete(0, tk.END)
                 phone_entry.insert(tk.END, selected_column_value.split()[0])
@@ -269,7 +263,6 @@ def select_columns(service, sheet_id):
             else:
                 messagebox.showerror("Error", "Please select only two columns.")
 
-    columns = list_columns(service, sheet_id, tab_entry.get())
     column_listbox = tk.Listbox(select_column_window, selectmode="single")
     column_listbox.pack(expand=True, fill="both")
     for column_info in columns:
@@ -290,161 +283,72 @@ def start_search():
 
 def search_and_update_drive(folder_id, column_name, phone_column, sheet_link, sheet_name, tab_name):
     """Search Google Drive for matching documents and update the hits in the GUI."""
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
-
-    # Retrieve all files in the specified folder
-    files = list_files(service, folder_id)
-
-    # Initialize hit count
-    hit_count = 0
-
     # Retrieve the selected sheet
-    sheet_id = re.search(r'/spreadsheets/d/([a-zA-Z0-9-_]+)', sheet_link)
-    if sheet_id:
-        sheet_id = sheet_id.group(1)
-    else:
+    sheet_id = parse_sheet_id(sheet_link)
+    if not sheet_id:
         messagebox.showerror("Error", "Invalid Google Sheet link.")
         return
 
-    service = build('sheets', 'v4', credentials=creds)
-
-    # Retrieve data from the selected sheet and tab
-    id_range = f"{tab_name}!{column_name}:{column_name}"
-    phone_range = f"{tab_name}!{phone_column}:{phone_column}"
-
-    id_data = service.spreadsheets().values().get(spreadsheetId=sheet_id, range=id_range).execute()
-    phone_data = service.spreadsheets().values().get(spreadsheetId=sheet_id, range=phone_range).execute()
-
-    ids = id_data.get('values', [])
-    phones = phone_data.get('values', [])
-
-    if ids:
-        # Extract the important numbers from the document names
-        document_numbers = [re.search(r'(\d+)#', file['name']).group(1) for file in files if re.search(r'(\d+)#', file['name'])]
-
-        # Extract IDs and phone numbers from the Google Sheet
-        sheet_ids = [row[0].lstrip('0') if row else "" for row in ids]  # Remove leading zeros
-        phone_numbers = [row[0] if row else "" for row in phones]  # Use phone number if ID is blank
-
-        # Count hits
-        for doc_number in document_numbers:
-            if doc_number.lstrip('0') in sheet_ids or doc_number.lstrip('0') in phone_numbers:
-                hit_count += 1
-
-                # Get the URL of the matching file
-                matching_file = next(file for file in files if re.search(rf'{doc_number}#', file['name']))
-                file_url = f"https://drive.google.com/file/d/{matching_file['id']}/view"
-
-                # Append the URL to the list
-                urls.append((matching_file['name'], file_url))
-
-    # Display the hit count in the GUI
-    hit_count_label.config(text=f"Total Hits: {hit_count}")
-
-    # Clear the Treeview
-    tree.delete(*tree.get_children())
-
-    # Display the hit files in the Treeview
-    for idx, url_info in enumerate(urls):
-        file_name, file_url = url_info
-        index_match = re.search(r'^(\d+)#', file_name)  # Extract index using regex
-        index = index_match.group(1) if index_match else ""  # Extracted index or empty string if not found
-
-        # Find the column name and row in the Google Sheets where the index appears
-        gs_name = ""
-        if index:
-            # Remove leading zeros from the index
-            index_without_zero = index.lstrip('0')
-            row = None
-            for i, (row_value1, row_value2) in enumerate(zip(ids, phones), start=1):
-                if row_value1 and index_without_zero in row_value1:
-                    row = i
-                    gs_name = f"{column_name}{row}"  # Construct the Google Sheets column name and row
-                    break
-                elif row_value2 and index_without_zero in row_value2:
-                    row = i
-                    gs_name = f"{phone_column}{row}"  # Construct the Google Sheets column name and row
-                    break
-
-        # Insert the values into the Treeview
-        tree.insert("", tk.END, values=(index, file_name, gs_name, file_url))
+    def search(task):
+        # Match the documents in the folder against the IDs and phone numbers of the sheet
+        return search_matches(drive_service(), sheets_service(), folder_id, sheet_id, tab_name,
+                              column_name, phone_column, progress=task.progress)
+
+    run_task(search, show_matches)
+
+def show_matches(matches):
+    """Display the hits of a search in the GUI."""
+    with metrics.stage('populate'):
+        results.set_matches(matches)
+        update_hit_count()
+        results_view.refresh()
+
+def update_hit_count():
+    """Show the number of hits, and how many pass the filter."""
+    text = f"Total Hits: {len(results.matches)}"
+    if len(results) != len(results.matches):
+        text += f" (showing {len(results)})"
+    hit_count_label.config(text=text)
+
+def filter_results(event=None):
+    """Filter the results by the text of the filter entry."""
+    results.filter(filter_entry.get())
+    update_hit_count()
+    results_view.refresh()
 
 def clear_results():
     """Clear search results."""
-    tree.delete(*tree.get_children())
-    hit_count_label.config(text="Total Hits: 0")
-    urls.clear()
-
-def get_non_empty_columns(sheet_id, tab_name):
-    """Retrieve non-empty columns in the specified Google Sheet tab."""
-    creds = authenticate()
-    service = build('sheets', 'v4', credentials=creds)
-
-    # Define the range to fetch only the first row of each column
-    range_name = f"{tab_name}!1:1"
-    
-    # Make the request to retrieve the values
-    result = service.spreadsheets().values().batchGet(spreadsheetId=sheet_id, ranges=[range_name]).execute()
-    value_ranges = result.get('valueRanges', [])
-
-    non_empty_columns = []
-    if value_ranges:
-        for value_range in value_ranges:
-            values = value_range.get('values', [])
-            if values:
-                for col_idx, cell in enumerate(values[0], start=1):
-                    if cell:  # If cell is not empty
-                        non_empty_columns.append(column_to_letter(col_idx))
-    return non_empty_columns
+    results.set_matches([])
+    update_hit_count()
+    results_view.refresh()
 
 def link():
     """Link URLs to empty columns in the Google Sheet."""
     # Get the selected Google Sheet and tab
-    sheet_id_match = re.search(r'/spreadsheets/d/([a-zA-Z0-9-_]+)', sheet_entry.get())
-    if sheet_id_match:
-        sheet_id = sheet_id_match.group(1)
-    else:
+    sheet_id = parse_sheet_id(sheet_entry.get())
+    if not sheet_id:
         messagebox.showerror("Error", "Invalid Google Sheet link.")
         return
 
     tab_name = tab_entry.get()
 
+    def on_columns(non_empty_columns):
+        if non_empty_columns:
+            # Prompt user to select an empty column using GUI
+            selected_column = simpledialog.askstring("Select Empty Column", "Enter the column letter where URLs will be pasted (e.g., A, B, C):")
+            if selected_column:
+                # Check if the selected column is valid
+                if selected_column.upper() not in non_empty_columns:
+                    # Link URLs to the selected column
+                    link_urls(sheet_id, tab_name, [selected_column.upper()])
+                elif messagebox.askyesno("Update Links", f"Column {selected_column.upper()} is not empty. Update the links "
+                                                         "in it, writing only the cells that changed?"):
+                    relink_urls(sheet_id, tab_name, [selected_column.upper()])
+        else:
+            messagebox.showerror("Error", "No non-empty columns found in the selected Google Sheet.")
+
     # Get non-empty columns
-    non_empty_columns = get_non_empty_columns(sheet_id, tab_name)
-
-    if non_empty_columns:
-        # Prompt user to select an empty column using GUI
-        selected_column = simpledialog.askstring("Select Empty Column", "Enter the column letter where URLs will be pasted (e.g., A, B, C):")
-        if selected_column:
-            # Check if the selected column is valid
-            if selected_column.upper() not in non_empty_columns:
-                # Link URLs to the selected column
-                link_urls(sheet_id, tab_name, [selected_column.upper()])
-            else:
-                messagebox.showerror("Error", "Selected column is not empty. Please select an empty column.")
-    else:
-        messagebox.showerror("Error", "No non-empty columns found in the selected Google Sheet.")
-
-def list_files(service, folder_id, page_token=None):
-    """List all files in the Google Drive folder with pagination."""
-    # Check if folder files list is already cached
-    if folder_id in memo:
-        return memo[folder_id]
-
-    files = []
-    while True:
-        response = service.files().list(q=f"'{folder_id}' in parents",
-                                        fields="nextPageToken, files(id, name)",
-                                        pageToken=page_token).execute()
-        files.extend(response.get('files', []))
-        page_token = response.get('nextPageToken')
-        if not page_token:
-            break
-
-    # Cache the folder files list
-    memo[folder_id] = files
-    return files
+    run_task(lambda task: get_non_empty_columns(sheets_service(), sheet_id, tab_name), on_columns)
 
 """def link_urls(sheet_id, tab_name, columns_to_fill):
     
@@ -515,76 +419,153 @@ def list_files(service, folder_id, page_token=None):
     messagebox.showinfo("URL Pasting", "URL pasting process finished.")"""
 def link_urls(sheet_id, tab_name, columns_to_fill):
     #Paste URLs from the hit log into the specified empty columns in the Google Sheet.
-    creds = authenticate()
-    service = build('sheets', 'v4', credentials=creds)
-    
     # Display notification when URL pasting starts
     messagebox.showinfo("URL Pasting", "URL pasting process started.")
-    
-    # Get the hit log URLs
-    urls_to_link = [url[1] for url in urls]
 
-    # Get the existing data in the Google Sheet
-    range_name = f"{tab_name}!A:Z"
-    values_cache_key = (sheet_id, range_name)  # Cache key for values
-    if values_cache_key in memo:
-        values = memo[values_cache_key]  # Retrieve values from cache
-    else:
-        result = service.spreadsheets().values().get(spreadsheetId=sheet_id, range=range_name).execute()
-        values = result.get('values', [])
-        memo[values_cache_key] = values  # Cache the values
-    
-    #print("Existing values in the Google Sheet:", values)  # Debug print
-    
-    if values:
-        # Prepare batch update request
-        batch_update_values_request = {
-            'value_input_option': 'RAW',
-            'data': []
-        }
+    to_link = list(results.matches)
+
+    def write(task):
+        service = sheets_service()
+        return link_matches(service, sheet_id, tab_name, to_link, columns_to_fill, progress=task.progress)
+
+    def on_error(error):
+        mark_unwritten(to_link, columns_to_fill, error)
+        show_task_error(error)
+
+    run_task(write, lambda stats: show_linked(to_link, stats), on_error)
+
+def relink_urls(sheet_id, tab_name, columns_to_fill):
+    """Update the links of a column filled by an earlier run, after confirming the planned changes."""
+    to_link = list(results.matches)
+
+    def plan_links(task):
+        return diff_links(sheets_service(), sheet_id, tab_name, to_link, columns_to_fill, progress=task.progress)
+
+    def on_plan(plan):
+        outcomes = plan['outcomes']
+        # Hits whose cell holds something else than a link are never written; flag them
+        results.set_status(outcomes['unchanged'], 'linked')
+        results.set_status(outcomes['conflicts'], 'conflict')
+        results_view.refresh()
+        if not plan['cells'] and not plan['clear']:
+            show_linked(outcomes['written'], None)
+            return
+        if not messagebox.askyesno("Update Links", f"Planned changes: {format_plan(plan)}.\n"
+                                                   f"Write {len(plan['cells'])} cells?"):
+            return
+        clear_stale = bool(plan['clear']) and messagebox.askyesno(
+            "Update Links", f"Also clear the {plan['stale']} links of rows that no longer match?")
+
+        def write(task):
+            return write_plan(sheets_service(), sheet_id, tab_name, plan, clear_stale, progress=task.progress)
+
+        def on_error(error):
+            mark_unwritten(outcomes['written'], columns_to_fill, error)
+            show_task_error(error)
+
+        run_task(write, lambda stats: show_linked(outcomes['written'], stats), on_error)
+
+    run_task(plan_links, on_plan)
+
+def mark_unwritten(matches, columns_to_fill, error):
+    """Mark in red the hits a failed write did not reach, and in green those written before it failed."""
+    written = error.written_cells() if isinstance(error, WriteError) else set()
+    columns = [column.upper() for column in columns_to_fill]
+    linked, failed = [], []
+    for match in matches:
+        (linked if all((match.row, column) in written for column in columns) else failed).append(match)
+    results.set_status(linked, 'linked')
+    results.set_status(failed, 'failed')
+    results_view.refresh()
+
+def show_linked(linked, stats):
+    """Mark the linked hits in the GUI (stats is None when there was nothing to write)."""
+    # Add a green check beside the pasted URLs, in one pass over the model
+    results.set_status(linked, 'linked')
+    results_view.refresh()
 
-        # Iterate over each URL and add it to the batch update request
-        for idx, url in enumerate(urls_to_link):
-            gs_name = tree.item(tree.get_children()[idx], 'values')[2]  # Get the G-S Name from the Treeview
-            if gs_name:
-                # Extract the row number from G-S Name (e.g., 'D23' -> row 23)
-                row_number = int(''.join(filter(str.isdigit, gs_name)))
-                # Iterate over the specified columns to fill
-                for col in columns_to_fill:
-                    # Add URL to batch update request
-                    range_to_update = f"{tab_name}!{col}{row_number}"
-                    batch_update_values_request['data'].append({
-                        'range': range_to_update,
-                        'values': [[url]]
-                    })
+    # Display notification when URL pasting finishes
+    if stats is None:
+        messagebox.showinfo("URL Pasting", "The links are already up to date.")
+        return
+    messagebox.showinfo("URL Pasting", f"URL pasting process finished.\n{stats['cells']} cells in {stats['requests']} requests "
+                                       f"({stats['cells_per_second']:.0f} cells/s, {stats['retries']} retries)")
 
-                    # Add a green check button beside the pasted URL
-                    #tree.insert('', 'end', values=(url, ""), tags=("GREEN_BUTTON",))
-                    tree.item(tree.get_children()[idx], values=("✔️", *tree.item(tree.get_children()[idx], 'values')[1:]), tags=("GREEN_BUTTON",))
-        #print("Batch update request:", batch_update_values_request)  # Debug print
 
-        # Execute batch update request
-        if batch_update_values_request['data']:
-            service.spreadsheets().values().batchUpdate(spreadsheetId=sheet_id, body=batch_update_values_request).execute()
+def set_status(message):
+    """Show a status message below the results."""
+    status_label.config(text=message)
 
-    # Apply styles
-    tree.tag_configure("GREEN_BUTTON", background="green")
-    
-    # Display notification when URL pasting finishes
-    messagebox.showinfo("URL Pasting", "URL pasting process finished.")
+def show_task_error(error):
+    """Report a failed background task."""
+    set_status("Failed")
+    messagebox.showerror("Error", str(error))
+
+def run_task(func, on_done, on_error=show_task_error):
+    """Run func(task) on a worker thread and pass its result to on_done on the UI thread."""
+    def done(result):
+        set_status("Ready")
+        on_done(result)
+
+    set_status("Working...")
+    return runner.submit(func, on_done=done, on_error=on_error, on_progress=set_status)
+
+def cancel_tasks():
+    """Cancel the running searches and links."""
+    runner.cancel_all()
+    set_status("Cancelled")
+
+def show_timings():
+    """Show the timings of the API calls and stages so far, and the cache hit rates."""
+    timings_window = tk.Toplevel(root)
+    timings_window.title("Timings")
+
+    timings_text = tk.Text(timings_window, width=100, height=30, font=("Courier", 9))
+    timings_text.pack(fill=tk.BOTH, expand=True)
+
+    def refresh():
+        timings_text.config(state=tk.NORMAL)
+        timings_text.delete("1.0", tk.END)
+        timings_text.insert(tk.END, format_report(metrics.report()))
+        timings_text.config(state=tk.DISABLED)
 
+    def reset():
+        metrics.reset()
+        refresh()
 
+    tk.Button(timings_window, text="Refresh", command=refresh).pack(side=tk.LEFT)
+    tk.Button(timings_window, text="Reset", command=reset).pack(side=tk.LEFT)
+    refresh()
 
+def sign_in():
+    """Validate the credentials and load the Google client libraries while the window is already up."""
+    def warm_up(task):
+        task.progress("Signing in...")
+        drive_service()
+        sheets_service()
+
+    run_task(warm_up, lambda result: None, on_error=lambda error: set_status(f"Sign-in failed: {error}"))
 
 def on_closing():
     """Close the application."""
     if messagebox.askokcancel("Quit", "Do you want to quit?"):
+        runner.shutdown()
         root.destroy()
 
 # Create the main window
 root = tk.Tk()
 root.title("Google Drive Search Tool")
 
+# Worker threads for the Google API calls
+runner = TaskRunner(root)
+
+# Keep Drive folder listings on disk between sessions (not those of the emulator, whose quota
+# sets the request rates instead)
+if registry.emulator is None:
+    use_store(ListingStore())
+else:
+    scheduler.configure(registry.emulator.limits())
+
 # Style for the Treeview widget
 style = ttk.Style()
 style.theme_use("clam")
@@ -643,57 +624,43 @@ link_button.grid(row=5, column=0, columnspan=3)
 clear_button = tk.Button(root, text="Clear Results", command=clear_results)
 clear_button.grid(row=5, column=2)
 
-# Create Treeview widget to display search results
-tree = ttk.Treeview(root, columns=('Check','Index', 'File Name', 'G-S Name', 'URL'), selectmode="browse")
-tree.heading('#0', text='')
-tree.heading('Check', text='Check')
-tree.heading('Index', text='Index')
-tree.heading('File Name', text='File Name')
-tree.heading('G-S Name', text='G-S Name')
-tree.heading('URL', text='URL')
-tree.column('#0', width=50, anchor='center')
-tree.column('Check', width=50, anchor='center')
-tree.column('Index', width=50, anchor='center')
-tree.column('File Name', width=200, anchor='center')
-tree.column('G-S Name', width=200, anchor='center')
-tree.column('URL', width=300, anchor='center')
-tree.grid(row=6, column=0, columnspan=3)
-
-# Function to paste URLs into Treeview
-def paste_urls(urls):
-    for idx, url_info in enumerate(urls):
-        file_name, file_url = url_info
-        item_id = tree.insert("", tk.END, values=("",idx+1, file_name, "", file_url))
-
-        # Verify URL is pasted correctly in the URL column (column index 4)
-        url_column_value = tree.set(item_id, column='URL')
-        if url_column_value == file_url:
-            # If URL is pasted correctly, add the checkmark in the first column
-            tree.item(item_id, values=("✔️ Check", idx + 1, file_name, "", file_url), tags=("GREEN_BUTTON",))
-        else:
-            # If URL is not pasted correctly, remove the checkmark
-            tree.item(item_id, values=("❌ Check", idx + 1, file_name, "", file_url), tags=("RED_BUTTON",))
-
-# Insert values into Treeview
-for idx, url_info in enumerate(urls):
-    file_name, file_url = url_info
-    tree.insert("", tk.END, values=("",idx+1, file_name,"", file_url))
+# Create the virtualized results view
+results_view = ResultsView(root, results)
+results_view.grid(row=6, column=0, columnspan=3)
 
 def copy_url(event):
     """Copy the URL to the clipboard when a user double-clicks on an item in the URL column."""
-    item = tree.selection()[0]  # Get the selected item
-    url = tree.item(item, 'values')[3]  # Get the URL from the fourth column (index 3)
-    root.clipboard_clear()  # Clear the clipboard
-    root.clipboard_append(url)  # Append the URL to the clipboard
+    match = results_view.selected_match()  # Get the selected match
+    if match:
+        root.clipboard_clear()  # Clear the clipboard
+        root.clipboard_append(match.url)  # Append the URL to the clipboard
 
 # Bind the double-click event to the Treeview to copy the URL
-tree.bind("<Double-1>", copy_url)
+results_view.tree.bind("<Double-1>", copy_url)
 
 
 # Create hit count label
 hit_count_label = tk.Label(root, text="Total Hits: 0")
 hit_count_label.grid(row=7, column=0, columnspan=3)
 
+# Create status label and cancel button for running tasks
+status_label = tk.Label(root, text="Ready")
+status_label.grid(row=8, column=0, columnspan=2, sticky="w")
+
+cancel_button = tk.Button(root, text="Cancel", command=cancel_tasks)
+cancel_button.grid(row=8, column=2)
+
+# Create filter widgets for the results
+filter_label = tk.Label(root, text="Filter:")
+filter_label.grid(row=9, column=0, sticky="e")
+
+filter_entry = tk.Entry(root)
+filter_entry.grid(row=9, column=1)
+filter_entry.bind("<KeyRelease>", filter_results)
+
+timings_button = tk.Button(root, text="Timings", command=show_timings)
+timings_button.grid(row=9, column=2)
+
 # Create Link URLs button
 #link_button = tk.Button(root, text="Link URLs", command=link)
 #link_button.grid(row=8, column=0, columnspan=3)
@@ -701,5 +668,8 @@ hit_count_label.grid(row=7, column=0, columnspan=3)
 # Bind the closing event
 root.protocol("WM_DELETE_WINDOW", on_closing)
 
+# Sign in in the background once the window is shown
+root.after_idle(sign_in)
+
 # Start the application
 root.mainloop()